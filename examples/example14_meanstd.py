@@ -6,6 +6,7 @@ Here, we plot the mean value (color) and standard deviation (size) of nodal pres
 # Import libraries
 import viswaternet as vis
 import matplotlib.pyplot as plt
+import numpy as np
 
 # Initialize VisWaterNet model
 model = vis.VisWNModel('Networks/CTown.inp')
@@ -22,11 +23,13 @@ stddev, elmnt_list = model.get_parameter(
 binnedParameter, interval_names = model.bin_parameter(stddev, elmnt_list, 4)
 # Set bin_sizes and create node_sizes array
 interval_sizes = [150, 250, 350, 450]
-node_sizes = [None]*len(elmnt_list)
+node_sizes = np.full(len(elmnt_list), interval_sizes[0])
+# Map each element to its position once instead of searching elmnt_list
+element_index = {element: i for i, element in enumerate(elmnt_list)}
 # Set node_sizes according to bin_sizes
 for interval_name, size in zip(interval_names, interval_sizes):
     for element in binnedParameter[interval_name]:
-        node_sizes[elmnt_list.index(element)] = size
+        node_sizes[element_index[element]] = size
 
 style = vis.NetworkStyle(cmap="winter_r",
                          node_size=node_sizes,
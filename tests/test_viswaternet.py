@@ -5,8 +5,11 @@
 import unittest
 import viswaternet
 import os
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
+import importlib.util
 
 model = viswaternet.VisWNModel("tests/net1.inp")
 style = viswaternet.NetworkStyle()
@@ -52,6 +55,7 @@ class TestParameterBinning(unittest.TestCase):
     def test_interval_naming(self):
         self.model = {}
         self.model['node_names'] = ['E1','E2','E3','E4','E5','E6']
+        self.model['node_index'] = {name:i for i,name in enumerate(self.model['node_names'])}
         dummy_data=[1,2,3,5,6,7]
         interval_results, interval_names = viswaternet.network.bin_parameter(self,dummy_data,self.model['node_names'],3,style=style)
         self.assertListEqual(interval_names,['1.000 - 3.000', '3.000 - 5.000', '5.000 - 7.000'],"Intervals are not being named properly.")
@@ -65,6 +69,7 @@ class TestParameterBinning(unittest.TestCase):
         """Tests that the dictionary produced by bin_parameter() is correct using trival case."""
         self.model = {}
         self.model['node_names'] = ['E1','E2','E3','E4','E5','E6']
+        self.model['node_index'] = {name:i for i,name in enumerate(self.model['node_names'])}
         dummy_data=[1,2,3,5,6,7]
         # =============================================================================
         # Correct dict structure should be a nested dict with two layers, including
@@ -104,7 +109,88 @@ class TestPlottingFunctions(unittest.TestCase):
         
         self.assertTrue(os.path.isfile('net1.png'),"plot_continuous_nodes() is not generating plot.")
         os.remove('net1.png')
-    
+
+    def test_color_bar_reuse(self):
+        fig,ax=plt.subplots()
+        model.plot_continuous_nodes(ax,parameter='pressure',value=1)
+        cbar = fig.axes[-1]
+        first = cbar._colorbar.mappable
+        model.plot_continuous_nodes(ax,parameter='pressure',value=5)
+        self.assertEqual(len(fig.axes),2,"Redrawing on the same axes is adding color bars.")
+        self.assertIs(fig.axes[-1],cbar,"Color bar is not being reused.")
+        self.assertIsNot(cbar._colorbar.mappable,first,"Reused color bar is not following the new plot.")
+
+    def test_color_bars_at_different_locations(self):
+        fig,ax=plt.subplots()
+        model.plot_continuous_nodes(ax,parameter='pressure',value=1)
+        model.plot_continuous_links(ax,parameter='length',style=viswaternet.NetworkStyle(color_bar_loc='left'))
+        self.assertEqual(len(fig.axes),3,"A color bar at a new location is replacing the existing one.")
+
+    def test_async_color_bar(self):
+        fig,ax=plt.subplots()
+        g=model.draw_nodes(ax,['10','11','12'],parameter_results=pd.Series([1.,2.,3.],index=['10','11','12']))
+        future=model.draw_color_bar(ax,g,color_bar_title='Pressure',async_=True)
+        viswaternet.utils.async_renderer.wait()
+        self.assertTrue(future.done(),"wait() is returning before queued drawing has finished.")
+        future.result()
+        self.assertEqual(len(fig.axes),2,"draw_color_bar(async_=True) is not adding the color bar.")
+
+    def test_size_legend_entries(self):
+        fig,ax=plt.subplots()
+        names=model.model['node_names']
+        sizes=[10 if name in model.model['tank_names'] else 100+30*i for i,name in enumerate(names)]
+        model.plot_unique_data(ax,parameter='custom_data',data_type='continuous',parameter_type='node',custom_data_values=[names,list(range(len(names)))],element_size_intervals=3,element_size_legend_labels=['small','mid','large'],element_size_legend_title='Size',element_size_legend_loc='lower left',style=viswaternet.NetworkStyle(node_size=sizes))
+        legend=[artist for artist in ax.artists if isinstance(artist,matplotlib.legend.Legend) and artist.get_title().get_text()=='Size'][0]
+        self.assertEqual([text.get_text() for text in legend.get_texts()],['small','mid','large'],"Size legend is dropping entries.")
+        marker_sizes=[handle.get_markersize() for handle in legend.legend_handles]
+        self.assertEqual(marker_sizes,sorted(marker_sizes),"Size legend labels are not paired with their sizes.")
+
+    def test_artist_update(self):
+        fig,ax=plt.subplots()
+        nodes=['10','11','12']
+        links=['10','11','12']
+        g=model.draw_nodes(ax,nodes,parameter_results=pd.Series([1.,2.,3.],index=nodes),node_size=100)
+        h=model.draw_nodes(ax,nodes[:2],parameter_results=pd.Series([4.,8.],index=nodes[:2]),node_size=100,artist=g)
+        self.assertIs(h,g,"draw_nodes() is not updating the given artist.")
+        self.assertEqual(len(g.get_offsets()),2,"draw_nodes() is not updating node positions.")
+        self.assertEqual(g.get_clim(),(4.,8.),"draw_nodes() is not updating color limits.")
+        g=model.draw_links(ax,links,parameter_results=pd.Series([1.,2.,3.],index=links),link_width=1,link_arrows=False,link_style='-')
+        h=model.draw_links(ax,links,parameter_results=pd.Series([5.,6.,7.],index=links),link_width=1,link_arrows=False,link_style='-',artist=g)
+        self.assertIs(h,g,"draw_links() is not updating the given artist.")
+        self.assertEqual(g.get_clim(),(5.,7.),"draw_links() is not updating color limits.")
+
+    def test_rasterize_nodes(self):
+        fig,ax=plt.subplots()
+        model.plot_unique_data(ax,parameter='custom_data',data_type='continuous',parameter_type='node',custom_data_values=[['10','11','12'],[10,6,15]],rasterize_nodes=True)
+        self.assertTrue(ax.collections[0].get_rasterized(),"rasterize_nodes=True is not rasterizing the data nodes.")
+        fig,ax=plt.subplots()
+        model.plot_unique_data(ax,parameter='custom_data',data_type='continuous',parameter_type='node',custom_data_values=[[],[]],rasterize_nodes=True)
+
+    def test_aggregate_oversampled_nodes(self):
+        fig,ax=plt.subplots(figsize=(0.5,0.5),dpi=20)
+        special=model.model['tank_names']+model.model['reservoir_names']
+        names=special+[name for name in model.model['node_names'] if name not in special]
+        node_list,results,node_size=viswaternet.drawing.base._aggregate_oversampled_nodes(model,ax,names,pd.Series(np.arange(len(names),dtype=float),index=names),100)
+        self.assertTrue(node_list,"Aggregated nodes are being dropped.")
+        self.assertFalse(set(node_list)&set(special),"Tanks and reservoirs are representing aggregated groups.")
+
+    def test_label_lengths(self):
+        fig,ax=plt.subplots()
+        model.draw_label(['A','B','C'],[10,-10],[10,10,10],ax=ax,draw_nodes=['10','11','12','13'],draw_arrow=False)
+        self.assertEqual([text.get_text() for text in ax.texts],['A','B'],"draw_label() is not ignoring extra labels, nodes or coordinates.")
+
+    def test_base_links_toggle(self):
+        fig,ax=plt.subplots()
+        model.plot_basic_elements(ax,style=viswaternet.NetworkStyle(draw_links=False))
+        labels=[text.get_text() for text in ax.get_legend().get_texts()]
+        self.assertNotIn('Pipes',labels,"draw_links=False is still adding pipes to the legend.")
+        self.assertFalse(any(isinstance(c,matplotlib.collections.LineCollection) for c in ax.collections),"draw_links=False is still drawing pipes.")
+        fig,ax=plt.subplots()
+        model.plot_basic_elements(ax,style=viswaternet.NetworkStyle(base_link_width=0,pump_element='link',pump_width=0))
+        labels=[text.get_text() for text in ax.get_legend().get_texts()]
+        self.assertNotIn('Pipes',labels,"Zero width pipes are still added to the legend.")
+        self.assertNotIn('Pumps',labels,"Zero width pumps are still added to the legend.")
+
     def test_continuous_links_plotting(self):
         fig,ax=plt.subplots()
         model.plot_continuous_links(ax,parameter='length',savefig=True)
@@ -131,6 +217,23 @@ class TestPlottingFunctions(unittest.TestCase):
         os.remove('DemandPatterns_net1.png')
         os.remove('Diameter_net1.png')
         os.remove('Custom_net1.png')
+    
+    @unittest.skipIf(importlib.util.find_spec('datashader') is None,"datashader is not installed.")
+    def test_unique_plotting_datashader(self):
+        elements=['10','11','12']
+        data=[10,6,15]
+        fig,ax=plt.subplots()
+        model.plot_unique_data(ax,parameter='custom_data',data_type='continuous',parameter_type ='node',custom_data_values=[elements,data],backend='datashader',save_name='Datashader_',savefig=True)
+        
+        self.assertTrue(os.path.isfile('Datashader_net1.png'),"plot_unique_data() is not generating datashader plot.")
+        os.remove('Datashader_net1.png')
+        
+        elements=['10','11','12']
+        fig,ax=plt.subplots()
+        model.plot_unique_data(ax,parameter='custom_data',data_type='continuous',parameter_type ='link',custom_data_values=[elements,data],backend='datashader',save_name='DatashaderLinks_',savefig=True)
+        
+        self.assertTrue(os.path.isfile('DatashaderLinks_net1.png'),"plot_unique_data() is not generating datashader link plot.")
+        os.remove('DatashaderLinks_net1.png')
         
     def test_animate_plot(self):
         fig,ax=plt.subplots()
@@ -172,9 +275,48 @@ class TestGetParameter(unittest.TestCase):
         self.assertAlmostEqual(results[0],91.91539,places=6,msg="Parameters are not in the correct order.")
         self.assertAlmostEqual(results[9],0,msg="Parameters are not in the correct order when reservoir data is collected.")
         self.assertAlmostEqual(results[10],40.014896,places=6,msg="Parameters are not in the correct order when tank data is collected.")
+
+    def test_summary_statistics(self):
+        pressure = model.model['results'].node['pressure']
+        mean, elements = model.get_parameter('node','pressure','mean')
+        stddev, elements = model.get_parameter('node','pressure','stddev')
+        np.testing.assert_allclose(mean.values,np.mean(pressure[elements].values,axis=0),rtol=1e-5,err_msg="Mean is not being computed correctly.")
+        np.testing.assert_allclose(stddev.values,np.std(pressure[elements].values,axis=0),rtol=1e-5,err_msg="Standard deviation is not being computed correctly.")
         
+    def test_run_scenarios(self):
+        import wntr
+        scenarios = [wntr.network.WaterNetworkModel("tests/net1.inp") for i in range(2)]
+        scenarios[1].get_node('10').elevation += 10
+        mean, stddev = model.run_scenarios(scenarios,'node','pressure',n_jobs=2)
+        pressures = []
+        for scenario in scenarios:
+            pressures.append(wntr.sim.EpanetSimulator(scenario).run_sim().node['pressure'])
+        pressures = np.concatenate([i.values for i in pressures]).astype(np.float64)
+        np.testing.assert_allclose(mean.values,np.mean(pressures,axis=0),rtol=1e-6,err_msg="Scenario means are not being combined correctly.")
+        np.testing.assert_allclose(stddev.values,np.std(pressures,axis=0),rtol=1e-6,atol=1e-6,err_msg="Scenario standard deviations are not being combined correctly.")
+
 class TestInitalizeFunction(unittest.TestCase):
     
+    def test_result_caching(self):
+        cache_dir = os.path.join(os.getcwd(), 'viswaternet_cache')
+        first = viswaternet.VisWNModel("tests/net1.inp",cache_results=True,cache_dir=cache_dir)
+        self.assertEqual(len(os.listdir(cache_dir)),1,"Simulation results are not being cached.")
+        second = viswaternet.VisWNModel("tests/net1.inp",cache_results=True,cache_dir=cache_dir)
+        np.testing.assert_array_equal(first.model['results'].node['pressure'].values,second.model['results'].node['pressure'].values,err_msg="Cached simulation results do not match.")
+        cache_file = os.path.join(cache_dir,os.listdir(cache_dir)[0])
+        with open(cache_file,'r+b') as f:
+            f.truncate(os.path.getsize(cache_file)//2)
+        third = viswaternet.VisWNModel("tests/net1.inp",cache_results=True,cache_dir=cache_dir)
+        np.testing.assert_array_equal(first.model['results'].node['pressure'].values,third.model['results'].node['pressure'].values,err_msg="A truncated cache file is not being treated as a cache miss.")
+        self.assertEqual(os.listdir(cache_dir),[os.path.basename(cache_file)],"Cache files are not being replaced cleanly.")
+        with open(cache_file,'wb') as f:
+            f.write(b'cviswaternet_missing_module\nResults\n.')
+        fourth = viswaternet.VisWNModel("tests/net1.inp",cache_results=True,cache_dir=cache_dir)
+        np.testing.assert_array_equal(first.model['results'].node['pressure'].values,fourth.model['results'].node['pressure'].values,err_msg="A cache file from other library versions is not being treated as a cache miss.")
+        for file in os.listdir(cache_dir):
+            os.remove(os.path.join(cache_dir,file))
+        os.rmdir(cache_dir)
+
     def test_list_sizes(self):
         self.assertEqual(len(model.model['junc_names']),9,"Junctions are not being collected properly.")
         self.assertEqual(len(model.model['valve_names']),0,"Valves are not being collected properly.")
@@ -4,14 +4,40 @@ The viswaternet.utils.base module contains plotting functions that are
 frequently utilized by other plotting functions. This includes base element
 drawing, legend drawing, color map, and label drawing functions.
 """
+from functools import lru_cache
+import copy
+import math
 import numpy as np
 import pandas as pd
 import networkx.drawing.nx_pylab as nxp
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 from matplotlib.lines import Line2D
+from matplotlib.markers import MarkerStyle
 from mpl_toolkits.axes_grid1 import make_axes_locatable
-from viswaternet.utils import save_fig, normalize_parameter
+from viswaternet.utils import save_fig, normalize_parameter, async_renderer
+
+
+def _label_anchors(node_coordinates, offsets):
+    """Returns the positions of labels offset from their nodes as an
+    (N, 2) array, and whether each label is to the right of its node."""
+    return node_coordinates + offsets, offsets[:, 0] >= 0
+
+
+def _get_cmap(self, cmap):
+    """Returns the colormap object for cmap, which is either the name of a
+    registered matplotlib colormap or a colormap object. mpl.colormaps hands
+    out a new copy on every lookup, so named colormaps are cached on the
+    model and reused across draws."""
+    if isinstance(cmap, mpl.colors.LinearSegmentedColormap) \
+            or isinstance(cmap, mpl.colors.ListedColormap):
+        return cmap
+    if not isinstance(cmap, str) or cmap not in mpl.colormaps:
+        raise Exception('Invalid cmap!')
+    cmaps = self.model["cmaps"]
+    if cmap not in cmaps:
+        cmaps[cmap] = mpl.colormaps[cmap]
+    return cmaps[cmap]
 
 
 def draw_nodes(
@@ -27,6 +53,9 @@ def draw_nodes(
         vmin=None,
         vmax=None,
         label=None,
+        backend="matplotlib",
+        artist=None,
+        rasterized=False,
         style=None):
     """Draws continuous nodal data onto the figure.
     
@@ -46,6 +75,24 @@ def draw_nodes(
         
     vmax : integer
         The maximum value of the color bar. 
+        
+    backend : string
+        Either 'matplotlib' or 'datashader'. The datashader backend
+        rasterizes nodal data into a single image instead of drawing one
+        marker per node, which is much faster for very large networks.
+        Requires the datashader package.
+    
+    artist : matplotlib.collections.PathCollection
+        The collection returned by an earlier call of draw_nodes with data.
+        If given, it is updated in place with the new nodes, data, sizes,
+        and color limits instead of drawing a new collection, which makes
+        redrawing frames of an animation much cheaper. Only used by the
+        matplotlib backend.
+    
+    rasterized : boolean
+        If True, the nodes are rasterized when the figure is saved in a
+        vector format (pdf, svg, eps), instead of writing one path per node.
+        Has no effect on raster formats such as png.
     """
     
     # Initalize parameters
@@ -70,16 +117,20 @@ def draw_nodes(
     if node_color is None:
         node_color = args['node_color']
     if node_size is None:
-        node_size = (np.ones(len(node_list)) * 100).tolist()
+        node_size = 100
     # Checks if some data values are given
-    if parameter_results.values.tolist():
-        # If values is less than this value, we treat it as a negative.
-        node_list = [node_list[node_list.index(name)]
-                     for name in node_list
-                     if ((name not in model["tank_names"]
-                          or draw_tanks is False)
-                     and (name not in model["reservoir_names"]
-                          or draw_reservoirs is False))]
+    if not parameter_results.empty:
+        kept_nodes = [i for i, name in enumerate(node_list)
+                      if ((name not in model["tank_names"]
+                           or draw_tanks is False)
+                      and (name not in model["reservoir_names"]
+                           or draw_reservoirs is False))]
+        # Per-node sizes are kept aligned with the nodes that are drawn so
+        # that every node can go into a single scatter collection
+        if isinstance(node_size, (list, np.ndarray)) \
+                and len(node_size) == len(node_list):
+            node_size = np.asarray(node_size)[kept_nodes]
+        node_list = [node_list[i] for i in kept_nodes]
         parameter_results = parameter_results.loc[node_list]
         parameter_results = parameter_results.values.tolist()
         if isinstance(node_size, tuple):
@@ -88,104 +139,375 @@ def draw_nodes(
             if min_size is not None and max_size is not None:
                 node_size = normalize_parameter(
                     parameter_results, min_size, max_size)
-        if np.min(parameter_results) < -1e-5:
-            # Gets the cmap object from matplotlib
-            try:
-                cmap = mpl.colormaps[cmap]
-            except Exception:
-                if isinstance(cmap, mpl.colors.LinearSegmentedColormap) \
-                    or isinstance(cmap, mpl.colors.ListedColormap):
-                        pass
-                else:
-                    raise Exception('Invalid cmap!')
-            # If both vmin and vmax are None, set vmax to the max data
-            # value and vmin to the negative of the max data value. This
-            # ensures that the colorbar is centered at 0.
-            if vmin is None and vmax is None:
-                g = nxp.draw_networkx_nodes(
-                    model["G"],
-                    model["pos_dict"],
-                    ax=ax,
-                    nodelist=node_list,
-                    node_size=node_size,
-                    node_color=parameter_results,
-                    cmap=cmap,
-                    vmax=np.max(parameter_results),
-                    vmin=-np.max(parameter_results),
-                    node_shape=node_shape,
-                    linewidths=node_border_width,
-                    edgecolors=node_border_color)
-            # Otherwise, just pass the user-given parameters
-            else:
-                g = nxp.draw_networkx_nodes(
-                    model["G"],
-                    model["pos_dict"],
-                    ax=ax,
-                    nodelist=node_list,
-                    node_size=node_size,
-                    node_color=parameter_results,
-                    vmax=vmax,
-                    vmin=vmin,
-                    cmap=cmap,
-                    node_shape=node_shape,
-                    linewidths=node_border_width,
-                    edgecolors=node_border_color)
-            # Return networkx object
-            return g
-        else:
-            # Gets the cmap object from matplotlib
-            try:
-                cmap = mpl.colormaps[cmap]
-            except Exception:
-                if isinstance(cmap, mpl.colors.LinearSegmentedColormap) \
-                    or isinstance(cmap, mpl.colors.ListedColormap):
-                        pass
-                else:
-                    raise Exception('Invalid cmap!')
-            # If both vmin and vmax are None, don't pass vmin and vmax,
-            # as networkx will handle the limits of the colorbar
-            # itself.
-            if vmin is None and vmax is None:
-                g = nxp.draw_networkx_nodes(
-                    model["G"],
-                    model["pos_dict"],
-                    ax=ax,
-                    nodelist=node_list,
-                    node_size=node_size,
-                    node_color=parameter_results,
-                    cmap=cmap,
-                    node_shape=node_shape,
-                    linewidths=node_border_width,
-                    edgecolors=node_border_color)
-            # Otherwise, just pass the user-given parameters
-            else:
-                g = nxp.draw_networkx_nodes(
-                    model["G"],
-                    model["pos_dict"],
-                    ax=ax,
-                    nodelist=node_list,
-                    node_size=node_size,
-                    node_color=parameter_results,
-                    cmap=cmap,
-                    node_shape=node_shape,
-                    linewidths=node_border_width,
-                    edgecolors=node_border_color,
-                    vmin=vmin,
-                    vmax=vmax)
-            # Return networkx object
-            return g
+        if backend == "datashader":
+            return _draw_nodes_datashader(self, ax, node_list,
+                                          parameter_results, node_size,
+                                          cmap, vmin, vmax)
+        values = np.asarray(parameter_results, dtype=np.float64)
+        min_value = values.min()
+        max_value = values.max()
+        # Gets the cmap object from matplotlib
+        cmap = _get_cmap(self, cmap)
+        # If the data has negative values and both vmin and vmax are None,
+        # set vmax to the max data value and vmin to the negative of the max
+        # data value. This ensures that the colorbar is centered at 0.
+        # Otherwise, None limits are left for matplotlib to handle.
+        if min_value < -1e-5 and vmin is None and vmax is None:
+            vmin = -max_value
+            vmax = max_value
+        if artist is not None:
+            artist.set_offsets(_node_coordinates(self, node_list))
+            artist.set_array(values)
+            artist.set_sizes(np.atleast_1d(node_size))
+            artist.set_cmap(cmap)
+            artist.set_clim(min_value if vmin is None else vmin,
+                            max_value if vmax is None else vmax)
+            return artist
+        # Return the node collection
+        return _draw_node_collection(
+            ax,
+            _node_coordinates(self, node_list),
+            s=node_size,
+            c=values,
+            cmap=cmap,
+            vmin=vmin,
+            vmax=vmax,
+            marker=node_shape,
+            linewidths=node_border_width,
+            edgecolors=node_border_color,
+            rasterized=rasterized)
     # Draw without any data associated with draw_nodes
     else:
-        nxp.draw_networkx_nodes(
+        _draw_node_collection(
+            ax,
+            _node_coordinates(self, node_list),
+            s=node_size,
+            c=node_color,
+            marker=node_shape,
+            edgecolors=node_border_color,
+            linewidths=node_border_width,
+            rasterized=rasterized)
+
+
+def _node_coordinates(self, node_list):
+    """Returns the coordinates of the nodes in node_list as an (N, 2) array,
+    gathered from the coordinate array built when the model is loaded."""
+    model = self.model
+    node_index = model["node_index"]
+    return model["node_coordinates"][[node_index[name] for name in node_list]]
+
+
+# MarkerStyle objects by marker, so string markers and the EPA marker paths
+# are parsed and normalized once instead of on every draw
+_MARKER_STYLES = {}
+
+
+def _marker_style(marker):
+    """Returns a cached MarkerStyle for marker. Markers that are already
+    MarkerStyle objects or can't be hashed are returned unchanged."""
+    if marker is None or isinstance(marker, MarkerStyle):
+        return marker
+    try:
+        style = _MARKER_STYLES.get(marker)
+    except TypeError:
+        return marker
+    if style is None:
+        style = _MARKER_STYLES[marker] = MarkerStyle(marker)
+    return style
+
+
+def _draw_node_collection(ax, coordinates, label=None, **kwargs):
+    """Draws a group of nodes with one style as a single PathCollection.
+    This is what nxp.draw_networkx_nodes does, minus rebuilding a position
+    array from a dict on every call. Empty groups and groups with a marker
+    size of 0 are skipped, since there is nothing to see and they would
+    still show up in the legend. Keyword arguments are passed to
+    ax.scatter."""
+    size = kwargs.get("s")
+    if len(coordinates) == 0 or (size is not None and not np.any(size)):
+        return None
+    if "marker" in kwargs:
+        kwargs["marker"] = _marker_style(kwargs["marker"])
+    collection = ax.scatter(coordinates[:, 0], coordinates[:, 1],
+                            label=label, **kwargs)
+    collection.set_zorder(2)
+    ax.tick_params(axis="both", which="both", bottom=False, left=False,
+                   labelbottom=False, labelleft=False)
+    return collection
+
+
+def _import_datashader():
+    try:
+        import datashader as ds
+    except ImportError:
+        raise ImportError("The datashader backend requires the datashader "
+                          "package. Install it with 'pip install datashader'.")
+    return ds
+
+
+def _datashader_ranges(coordinates):
+    """Returns the x and y ranges of a datashader canvas covering
+    coordinates. The canvas is padded so elements on the edge of the network
+    are not clipped."""
+    x_min, y_min = np.min(coordinates, axis=0)
+    x_max, y_max = np.max(coordinates, axis=0)
+    pad_x = 0.05 * (x_max - x_min) or 1
+    pad_y = 0.05 * (y_max - y_min) or 1
+    return (x_min - pad_x, x_max + pad_x), (y_min - pad_y, y_max + pad_y)
+
+
+def _draw_aggregate(ax, aggregate, x_range, y_range, cmap, vmin, vmax,
+                    zorder):
+    """Draws a datashader aggregate onto ax as an image. Empty cells are NaN
+    and are left transparent."""
+    return ax.imshow(aggregate.values,
+                     origin="lower",
+                     extent=(*x_range, *y_range),
+                     cmap=cmap,
+                     vmin=vmin,
+                     vmax=vmax,
+                     interpolation="nearest",
+                     aspect="auto",
+                     zorder=zorder)
+
+
+def _draw_nodes_datashader(
+        self,
+        ax,
+        node_list,
+        parameter_results,
+        node_size,
+        cmap,
+        vmin,
+        vmax):
+    """Aggregates nodal data onto a datashader canvas and draws the result
+    as a single image. Canvas cells are roughly the size of a node marker, and
+    nodes sharing a cell are averaged. The returned AxesImage can be passed to
+    draw_color_bar like any other mappable."""
+    ds = _import_datashader()
+    coordinates = _node_coordinates(self, node_list)
+    parameter_results = np.asarray(parameter_results, dtype=np.float64)
+    min_value = parameter_results.min()
+    max_value = parameter_results.max()
+    if min_value < -1e-5 and vmin is None and vmax is None:
+        vmax = max_value
+        vmin = -vmax
+    cmap = _get_cmap(self, cmap)
+    x_range, y_range = _datashader_ranges(coordinates)
+    fig = ax.figure
+    bbox = ax.get_window_extent()
+    marker_pixels = max(np.sqrt(np.max(node_size)) * fig.dpi / 72, 1)
+    canvas = ds.Canvas(plot_width=max(int(bbox.width / marker_pixels), 1),
+                       plot_height=max(int(bbox.height / marker_pixels), 1),
+                       x_range=x_range,
+                       y_range=y_range)
+    data = pd.DataFrame({"x": coordinates[:, 0],
+                         "y": coordinates[:, 1],
+                         "value": parameter_results})
+    aggregate = canvas.points(data, "x", "y", ds.mean("value"))
+    return _draw_aggregate(ax, aggregate, x_range, y_range, cmap, vmin, vmax,
+                           zorder=2)
+
+
+def _draw_links_datashader(
+        self,
+        ax,
+        link_list,
+        parameter_results,
+        link_width,
+        cmap,
+        vmin,
+        vmax):
+    """Aggregates link data onto a datashader canvas and draws the result
+    as a single image. Canvas cells are roughly as wide as a link, and links
+    crossing the same cell are averaged. The returned AxesImage can be passed
+    to draw_color_bar like any other mappable."""
+    ds = _import_datashader()
+    model = self.model
+    link_index = model["link_index"]
+    segments = model["link_segments"][[link_index[name]
+                                       for name in link_list]]
+    parameter_results = np.asarray(parameter_results, dtype=np.float64)
+    min_value = parameter_results.min()
+    max_value = parameter_results.max()
+    if min_value < -1e-5 and vmin is None and vmax is None:
+        vmax = max_value
+        vmin = -vmax
+    cmap = _get_cmap(self, cmap)
+    x_range, y_range = _datashader_ranges(segments.reshape(-1, 2))
+    fig = ax.figure
+    bbox = ax.get_window_extent()
+    line_pixels = max(np.max(link_width) * fig.dpi / 72, 1)
+    canvas = ds.Canvas(plot_width=max(int(bbox.width / line_pixels), 1),
+                       plot_height=max(int(bbox.height / line_pixels), 1),
+                       x_range=x_range,
+                       y_range=y_range)
+    data = pd.DataFrame({"x0": segments[:, 0, 0],
+                         "y0": segments[:, 0, 1],
+                         "x1": segments[:, 1, 0],
+                         "y1": segments[:, 1, 1],
+                         "value": parameter_results})
+    aggregate = canvas.line(data, x=["x0", "x1"], y=["y0", "y1"], axis=1,
+                            agg=ds.mean("value"))
+    return _draw_aggregate(ax, aggregate, x_range, y_range, cmap, vmin, vmax,
+                           zorder=1)
+
+
+def _aggregate_oversampled_nodes(
+        self,
+        ax,
+        node_list,
+        parameter_results,
+        node_size,
+        style=None):
+    """Keeps one node per pixel of the axes when nodes overlap. Nodes are
+    grouped by the pixel they fall on, the first node of each group is kept
+    as its representative, and it is given the mean value and largest size
+    of its group. Tanks and reservoirs that draw_nodes leaves to their own
+    markers are dropped first, so they never represent a group. Returns the
+    reduced node list, a Series of values indexed by node name, and the node
+    sizes."""
+    model = self.model
+    if style is None:
+        style = self.default_style
+    args = style.args
+    excluded = set()
+    if args['draw_tanks'] is not False:
+        excluded.update(model["tank_names"])
+    if args['draw_reservoirs'] is not False:
+        excluded.update(model["reservoir_names"])
+    kept_nodes = [i for i, name in enumerate(node_list)
+                  if name not in excluded]
+    if isinstance(node_size, (list, np.ndarray)) \
+            and len(node_size) == len(node_list):
+        node_size = np.asarray(node_size)[kept_nodes]
+    node_list = [node_list[i] for i in kept_nodes]
+    if not node_list:
+        return node_list, parameter_results.loc[node_list], node_size
+    coordinates = _node_coordinates(self, node_list)
+    bbox = ax.get_window_extent()
+    spans = np.ptp(coordinates, axis=0)
+    spans[spans == 0] = 1
+    cells = np.floor((coordinates - np.min(coordinates, axis=0)) / spans
+                     * [bbox.width - 1, bbox.height - 1]).astype(int)
+    data = pd.DataFrame({
+        "cell_x": cells[:, 0],
+        "cell_y": cells[:, 1],
+        "value": np.asarray(parameter_results.loc[node_list],
+                            dtype=np.float64),
+        "position": np.arange(len(node_list))})
+    per_node_size = isinstance(node_size, (list, np.ndarray)) \
+        and len(node_size) == len(node_list)
+    if per_node_size:
+        data["size"] = node_size
+    groups = data.groupby(["cell_x", "cell_y"], sort=False)
+    node_list = [node_list[i] for i in groups["position"].first()]
+    parameter_results = pd.Series(groups["value"].mean().to_numpy(),
+                                  index=node_list)
+    if per_node_size:
+        node_size = groups["size"].max().to_numpy()
+    return node_list, parameter_results, node_size
+
+
+def _link_edges(self, link_list):
+    """Returns the (start node, end node) pair of each link in link_list."""
+    model = self.model
+    pipe_list = model["pipe_list"]
+    link_index = model["link_index"]
+    return [pipe_list[link_index[name]] for name in link_list]
+
+
+def _draw_link_collection(
+        self,
+        ax,
+        link_list,
+        edge_color="k",
+        edge_cmap=None,
+        edge_vmin=None,
+        edge_vmax=None,
+        width=1.0,
+        style="-",
+        arrows=False,
+        artist=None,
+        rasterized=False):
+    """Draws the links in link_list. Takes the same arguments as
+    nxp.draw_networkx_edges. Links drawn without arrows go into a single
+    LineCollection built from the segment array computed when the model is
+    loaded, the same way networkx draws them but without rebuilding
+    segments from pos_dict. If artist is a LineCollection from an earlier
+    call, it is updated in place instead. Links with arrows are handed to
+    networkx. rasterized only applies to the LineCollection, since
+    matplotlib cannot rasterize arrow patches."""
+    model = self.model
+    if arrows is not False:
+        if artist is not None:
+            raise Exception('Only links drawn without arrows can be '
+                            'updated in place!')
+        return nxp.draw_networkx_edges(
             model["G"],
             model["pos_dict"],
             ax=ax,
-            nodelist=node_list,
-            node_size=node_size,
-            node_color=node_color,
-            node_shape=node_shape,
-            edgecolors=node_border_color,
-            linewidths=node_border_width)
+            edgelist=_link_edges(self, link_list),
+            edge_color=edge_color,
+            edge_cmap=edge_cmap,
+            edge_vmin=edge_vmin,
+            edge_vmax=edge_vmax,
+            width=width,
+            style=style,
+            arrows=arrows,
+            node_size=0)
+    if len(link_list) == 0:
+        return []
+    link_index = model["link_index"]
+    segments = model["link_segments"][[link_index[name]
+                                       for name in link_list]]
+    # Numeric colors are mapped through the colormap like networkx does.
+    # Colormaps already map by indexing their own lookup table, so this
+    # stays a single vectorized call even for data with few distinct values
+    values = None
+    if np.iterable(edge_color) and not isinstance(edge_color, str) \
+            and len(edge_color) == len(segments):
+        values = np.asarray(edge_color)
+        if values.ndim != 1 or not np.issubdtype(values.dtype, np.number):
+            values = None
+    if values is not None:
+        if edge_cmap is None:
+            edge_cmap = plt.get_cmap()
+        if edge_vmin is None:
+            edge_vmin = values.min()
+        if edge_vmax is None:
+            edge_vmax = values.max()
+        edge_color = edge_cmap(mpl.colors.Normalize(
+            vmin=edge_vmin, vmax=edge_vmax)(values))
+    if artist is not None:
+        artist.set_segments(segments)
+        artist.set_color(edge_color)
+        artist.set_linewidth(width)
+        artist.set_linestyle(style)
+        artist.set_cmap(edge_cmap)
+        artist.set_clim(edge_vmin, edge_vmax)
+        return artist
+    collection = mpl.collections.LineCollection(
+        segments,
+        colors=edge_color,
+        linewidths=width,
+        antialiaseds=(1,),
+        linestyle=style,
+        rasterized=rasterized)
+    collection.set_cmap(edge_cmap)
+    collection.set_clim(edge_vmin, edge_vmax)
+    # Links go behind nodes
+    collection.set_zorder(1)
+    ax.add_collection(collection)
+    corners = segments.reshape(-1, 2)
+    lower = corners.min(axis=0)
+    upper = corners.max(axis=0)
+    padding = 0.05 * (upper - lower)
+    ax.update_datalim((lower - padding, upper + padding))
+    ax.autoscale_view()
+    ax.tick_params(axis="both", which="both", bottom=False, left=False,
+                   labelbottom=False, labelleft=False)
+    return collection
 
 
 def draw_links(
@@ -199,6 +521,9 @@ def draw_links(
         link_color=None,
         vmin=None,
         vmax=None,
+        backend="matplotlib",
+        artist=None,
+        rasterized=False,
         style=None):
     """Draws continuous link data onto the figure.
     
@@ -218,6 +543,26 @@ def draw_links(
     
     vmax : integer
         The maximum value of the color bar.    
+        
+    backend : string
+        Either 'matplotlib' or 'datashader'. The datashader backend
+        rasterizes link data into a single image instead of drawing every
+        link, which is much faster for very large networks. Links without
+        data are always drawn with matplotlib. Requires the datashader
+        package.
+    
+    artist : matplotlib.collections.LineCollection
+        The collection returned by an earlier call of draw_links with data.
+        If given, it is updated in place with the new links, data, widths,
+        and color limits instead of drawing a new collection, which makes
+        redrawing frames of an animation much cheaper. Only links drawn
+        without arrows by the matplotlib backend can be updated.
+    
+    rasterized : boolean
+        If True, the links are rasterized when the figure is saved in a
+        vector format (pdf, svg, eps), instead of writing one path per link.
+        Has no effect on raster formats such as png, or on links drawn with
+        arrows.
     """
     # Initalize parameters
     model = self.model
@@ -237,25 +582,20 @@ def draw_links(
         link_arrows = args['link_arrows']
     if link_color is None:
         link_color = args['link_color']
-    if isinstance(link_list, np.ndarray):
-        link_list = link_list.tolist()
     if parameter_results is None:
         parameter_results = pd.DataFrame([])
-    # Creates default list of link widths
+    # Default link width, broadcast by matplotlib
     if link_width is None:
-        link_width = (np.ones(len(link_list)) * 1).tolist()
+        link_width = 1
     # Checks if some data values are given
-    if parameter_results.values.tolist():
-        link_list = [link_list[link_list.index(name)]
-                     for name in link_list
+    if not parameter_results.empty:
+        link_list = [name for name in link_list
                      if ((name not in model["pump_names"]
                           or pump_element == 'node'
                           or draw_pumps is False)
                      and (name not in model["valve_names"]
                           or valve_element == 'node'
                           or draw_valves is False))]
-        edges = [model["pipe_list"][model['G_pipe_name_list'].index(name)]
-                 for name in link_list]
         parameter_results = parameter_results.loc[link_list]
         parameter_results = parameter_results.values.tolist()
         if isinstance(link_width, tuple):
@@ -264,106 +604,47 @@ def draw_links(
             if min_size is not None and max_size is not None:
                 link_width = normalize_parameter(
                     parameter_results, min_size, max_size)
-        if np.min(parameter_results) < -1e-5:
-            # Gets the cmap object from matplotlib
-            try:
-                cmap = mpl.colormaps[cmap]
-            except Exception:
-                if isinstance(cmap, mpl.colors.LinearSegmentedColormap) \
-                    or isinstance(cmap, mpl.colors.ListedColormap):
-                        pass
-                else:
-                    raise Exception('Invalid cmap!')
-            # If both vmin and vmax are None, set vmax to the max data
-            # value and vmin to the negative of the max data value. This
-            # ensures that the colorbar is centered at 0.
-            if vmin is None and vmax is None:
-                g = nxp.draw_networkx_edges(
-                    model["G"],
-                    model["pos_dict"],
-                    ax=ax,
-                    edgelist=edges,
-                    edge_color=parameter_results,
-                    edge_vmax=np.max(parameter_results),
-                    edge_vmin=-np.max(parameter_results),
-                    edge_cmap=cmap,
-                    style=link_style,
-                    arrows=link_arrows,
-                    width=link_width,
-                    node_size=0)
-            # Otherwise, just pass the user-given parameters
-            else:
-                g = nxp.draw_networkx_edges(
-                    model["G"],
-                    model["pos_dict"],
-                    ax=ax,
-                    edgelist=edges,
-                    edge_color=parameter_results,
-                    edge_vmax=vmax,
-                    edge_vmin=vmin,
-                    edge_cmap=cmap,
-                    style=link_style,
-                    arrows=link_arrows,
-                    width=link_width,
-                    node_size=0)
-            # Return networkx object
-            return g
-        else:
-            # Gets the cmap object from matplotlib
-            try:
-                cmap = mpl.colormaps[cmap]
-            except Exception:
-                if isinstance(cmap, mpl.colors.LinearSegmentedColormap) \
-                    or isinstance(cmap, mpl.colors.ListedColormap):
-                        pass
-                else:
-                    raise Exception('Invalid cmap!')
-            # If both vmin and vmax are None, don't pass vmin and vmax,
-            # as networkx will handle the limits of the colorbar
-            # itself.
-            if vmin is None and vmax is None:
-                g = nxp.draw_networkx_edges(
-                    model["G"],
-                    model["pos_dict"],
-                    ax=ax,
-                    edgelist=edges,
-                    edge_color=parameter_results,
-                    edge_cmap=cmap,
-                    style=link_style,
-                    arrows=link_arrows,
-                    width=link_width,
-                    node_size=0)
-            # Otherwise, just pass the user-given parameters
-            else:
-                g = nxp.draw_networkx_edges(
-                    model["G"],
-                    model["pos_dict"],
-                    ax=ax,
-                    edgelist=edges,
-                    edge_color=parameter_results,
-                    edge_cmap=cmap,
-                    style=link_style,
-                    arrows=link_arrows,
-                    width=link_width,
-                    edge_vmin=vmin,
-                    edge_vmax=vmax,
-                    node_size=0)
-            # Return networkx object
-            return g
+        if backend == "datashader":
+            return _draw_links_datashader(self, ax, link_list,
+                                          parameter_results, link_width,
+                                          cmap, vmin, vmax)
+        values = np.asarray(parameter_results, dtype=np.float64)
+        min_value = values.min()
+        max_value = values.max()
+        # Gets the cmap object from matplotlib
+        cmap = _get_cmap(self, cmap)
+        # If the data has negative values and both vmin and vmax are None,
+        # set vmax to the max data value and vmin to the negative of the max
+        # data value. This ensures that the colorbar is centered at 0.
+        # Otherwise, None limits are taken from the data.
+        if min_value < -1e-5 and vmin is None and vmax is None:
+            vmin = -max_value
+            vmax = max_value
+        # Return the link collection
+        return _draw_link_collection(
+            self,
+            ax,
+            link_list,
+            edge_color=values,
+            edge_vmin=vmin,
+            edge_vmax=vmax,
+            edge_cmap=cmap,
+            style=link_style,
+            arrows=link_arrows,
+            artist=artist,
+            rasterized=rasterized,
+            width=link_width)
     # Draw without any data associated with draw_links
     else:
-        edges = [model["pipe_list"][model['G_pipe_name_list'].index(name)]
-             for name in link_list]
-        nxp.draw_networkx_edges(
-            model["G"],
-            model["pos_dict"],
-            ax=ax,
-            edgelist=edges,
+        _draw_link_collection(
+            self,
+            ax,
+            link_list,
             edge_color=link_color,
             style=link_style,
             arrows=link_arrows,
-            width=link_width,
-            node_size=0)
+            rasterized=rasterized,
+            width=link_width)
 
 
 def draw_base_elements(
@@ -407,6 +688,7 @@ def draw_base_elements(
     draw_pumps = args['draw_pumps']
     valve_element = args['valve_element']
     draw_valves = args['draw_valves']
+    draw_links = args['draw_links']
     base_link_color = args['base_link_color']
     base_link_width = args['base_link_width']
     base_link_line_style = args['base_link_line_style']
@@ -429,111 +711,81 @@ def draw_base_elements(
     pump_arrows = args['pump_arrows']
     # If draw_nodes is True, then draw draw_nodes
     if draw_nodes:
-        node_list = model['node_names']
-        if element_list is None or draw_originator == 'link':
-            node_list = [node_list[node_list.index(name)]
-                         for name in node_list
-                         if ((name not in model["tank_names"]
-                              or draw_tanks is False)
-                         and (name not in model["reservoir_names"]
-                              or draw_reservoirs is False))]
-        else:
-            node_list = [node_list[node_list.index(name)]
-                         for name in node_list
-                         if ((name not in model["tank_names"]
-                              or draw_tanks is False)
-                         and (name not in model["reservoir_names"]
-                              or draw_reservoirs is False)
-                         and (name not in element_list))]
-        nxp.draw_networkx_nodes(
-            model["G"],
-            model["pos_dict"],
-            node_size=base_node_size,
-            nodelist=node_list,
-            node_color=base_node_color,
-            ax=ax)
+        # Tanks and reservoirs get their own markers below, and nodes that
+        # carry data were already drawn by the caller
+        excluded = set()
+        if draw_tanks is not False:
+            excluded.update(model["tank_names"])
+        if draw_reservoirs is not False:
+            excluded.update(model["reservoir_names"])
+        if element_list is not None and draw_originator != 'link':
+            excluded.update(element_list)
+        node_list = [name for name in model['node_names']
+                     if name not in excluded]
+        _draw_node_collection(
+            ax,
+            _node_coordinates(self, node_list),
+            s=base_node_size,
+            c=base_node_color)
     # If draw_reservoirs is True, then draw draw_reservoirs
     if draw_reservoirs:
-        nxp.draw_networkx_nodes(
-            model["G"],
-            model["pos_dict"],
-            ax=ax,
-            nodelist=model["reservoir_names"],
-            node_size=reservoir_size,
-            node_color=reservoir_color,
+        _draw_node_collection(
+            ax,
+            _node_coordinates(self, model["reservoir_names"]),
+            s=reservoir_size,
+            c=reservoir_color,
             edgecolors=reservoir_border_color,
             linewidths=reservoir_border_width,
-            node_shape=reservoir_shape,
+            marker=reservoir_shape,
             label="Reservoirs")
     # If draw_tanks is True, then draw draw_tanks
     if draw_tanks:
-        nxp.draw_networkx_nodes(
-            model["G"],
-            model["pos_dict"],
-            ax=ax,
-            nodelist=model["tank_names"],
-            node_size=tank_size,
-            node_color=tank_color,
+        _draw_node_collection(
+            ax,
+            _node_coordinates(self, model["tank_names"]),
+            s=tank_size,
+            c=tank_color,
             edgecolors=tank_border_color,
             linewidths=tank_border_width,
-            node_shape=tank_shape,
+            marker=tank_shape,
             label="Tanks")
     # If draw_links is True, then draw draw_links
     if draw_links:
-        pipe_name_list = model['G_pipe_name_list']
-        if element_list is None or draw_originator == 'node':
-            edgelist = [model['pipe_list'][pipe_name_list.index(name)]
-                        for name in pipe_name_list
-                        if ((name not in model["pump_names"]
-                             or pump_element == 'node'
-                             or draw_pumps is False)
-                        and (name not in model["valve_names"]
-                             or valve_element == 'node'
-                             or draw_valves is False))]
-        else:
-            edgelist = [model['pipe_list'][pipe_name_list.index(name)]
-                        for name in pipe_name_list
-                        if ((name not in model["pump_names"]
-                             or pump_element == 'node'
-                             or draw_pumps is False)
-                        and (name not in model["valve_names"]
-                             or valve_element == 'node'
-                             or draw_valves is False)
-                        and (name not in element_list))]
-        nxp.draw_networkx_edges(
-            model["G"],
-            model["pos_dict"],
-            edgelist=edgelist,
-            ax=ax,
-            edge_color=base_link_color,
-            width=base_link_width,
-            style=base_link_line_style,
-            arrows=base_link_arrows)
+        # Pumps and valves drawn as links get their own style below, and
+        # links that carry data were already drawn by the caller
+        excluded = set()
+        if pump_element != 'node' and draw_pumps is not False:
+            excluded.update(model["pump_names"])
+        if valve_element != 'node' and draw_valves is not False:
+            excluded.update(model["valve_names"])
+        if element_list is not None and draw_originator != 'node':
+            excluded.update(element_list)
+        link_list = [name for name in model['G_pipe_name_list']
+                     if name not in excluded]
+        if link_list and np.any(base_link_width):
+            _draw_link_collection(
+                self,
+                ax,
+                link_list,
+                edge_color=base_link_color,
+                width=base_link_width,
+                style=base_link_line_style,
+                arrows=base_link_arrows)
     # If draw_valves is True, then draw draw_valves
     if draw_valves:
         if valve_element == 'node':
-            valve_coordinates = {}
-            # For each valve, calculate midpoint along link it is located at
-            # then store the coordinates of where valve should be drawn
-            for i, (point1, point2) in enumerate(model["G_list_valves_only"]):
-                midpoint = [(model["wn"].get_node(point1).coordinates[0]
-                             + model["wn"].get_node(point2).coordinates[0])/2,
-                            (model["wn"].get_node(point1).coordinates[1]
-                             + model["wn"].get_node(point2).coordinates[1])/2]
-                valve_coordinates[model["valve_names"][i]] = midpoint
-            # Draw draw_valves after midpoint calculations
-            nxp.draw_networkx_nodes(
-                model["G"],
-                valve_coordinates,
-                ax=ax,
-                nodelist=model["valve_names"],
-                node_size=valve_size,
-                node_color=valve_color,
+            # Valves are drawn at the midpoint of the link they sit on
+            _draw_node_collection(
+                ax,
+                model["valve_midpoints"],
+                s=valve_size,
+                c=valve_color,
                 edgecolors=valve_border_color,
                 linewidths=valve_border_width,
-                node_shape=valve_shape,
+                marker=valve_shape,
                 label="Valves")
-        elif valve_element == 'link':
+        elif valve_element == 'link' and model["G_list_valves_only"] \
+                and np.any(valve_width):
             nxp.draw_networkx_edges(
                 model["G"],
                 model["pos_dict"],
@@ -546,28 +798,18 @@ def draw_base_elements(
     # If draw_pumps is True, then draw draw_pumps
     if draw_pumps:
         if pump_element == 'node':
-            pump_coordinates = {}
-            # For each valve, calculate midpoint along link it is located at
-            # then store the coordinates of where pump should be drawn
-            for i, (point1, point2) in enumerate(model["G_list_pumps_only"]):
-                midpoint = [(model["wn"].get_node(point1).coordinates[0]
-                             + model["wn"].get_node(point2).coordinates[0])/2,
-                            (model["wn"].get_node(point1).coordinates[1]
-                             + model["wn"].get_node(point2).coordinates[1])/2]
-                pump_coordinates[model["pump_names"][i]] = midpoint
-            # Draw draw_valves after midpoint calculations
-            nxp.draw_networkx_nodes(
-                model["G"],
-                pump_coordinates,
-                ax=ax,
-                nodelist=model["pump_names"],
-                node_size=pump_size,
-                node_color=pump_color,
+            # Pumps are drawn at the midpoint of the link they sit on
+            _draw_node_collection(
+                ax,
+                model["pump_midpoints"],
+                s=pump_size,
+                c=pump_color,
                 edgecolors=pump_border_color,
                 linewidths=pump_border_width,
-                node_shape=pump_shape,
+                marker=pump_shape,
                 label="Pumps")
-        elif pump_element == 'link':
+        elif pump_element == 'link' and model["G_list_pumps_only"] \
+                and np.any(pump_width):
             nxp.draw_networkx_edges(
                 model["G"],
                 model["pos_dict"],
@@ -585,6 +827,7 @@ def plot_basic_elements(
         draw_nodes=True,
         savefig=False,
         save_name=None,
+        rasterized=False,
         style=None):
     """User-level function that draws base elements with no data assocaited with
     them, draws a legend, and saves the figure.
@@ -610,6 +853,12 @@ def plot_basic_elements(
         ...
         >>>model.save_fig(save_name='_example')
         <Net3_example.png>
+    
+    rasterized : boolean
+        If True, the drawn network elements are rasterized when the figure is
+        saved in a vector format (pdf, svg, eps), which keeps large networks
+        from being written out one path per element. Has no effect on raster
+        formats such as png, or on links drawn with arrows.
     """
     if style is None:
         style = self.default_style
@@ -620,11 +869,15 @@ def plot_basic_elements(
             fig, ax = plt.subplots(figsize=self.figsize)
             ax.set_frame_on(self.axis_frame)
     # Draw all base elements w/o data associated with them
+    drawn = len(ax.collections)
     draw_base_elements(
         self,
         ax,
         draw_nodes=draw_nodes,
         style=style)
+    if rasterized:
+        for collection in ax.collections[drawn:]:
+            collection.set_rasterized(True)
     # Draw legend if legend is True. Only draws base elements legend
     draw_legend(
         self,
@@ -635,6 +888,44 @@ def plot_basic_elements(
         save_fig(self, save_name=save_name, style=style)
 
 
+def _finalize_legend(ax, legend, title_color=None):
+    """Aligns legend text to the left, colors the title if title_color is
+    given, and adds the legend to ax so later legends don't replace it."""
+    legend._legend_box.align = "left"
+    if title_color is not None:
+        legend.get_title().set_color(title_color)
+    ax.add_artist(legend)
+
+
+def _legend_sizes(sizes, intervals):
+    """Returns intervals evenly spaced sizes from the smallest to the largest
+    of sizes, like np.linspace but as a list of floats. Size legends only
+    have a handful of entries, so plain Python is faster here."""
+    min_size = float(np.min(sizes))
+    max_size = float(np.max(sizes))
+    if intervals < 2:
+        return [min_size] * max(intervals, 0)
+    step = (max_size - min_size) / (intervals - 1)
+    return [min_size + i * step for i in range(intervals - 1)] + [max_size]
+
+
+@lru_cache(maxsize=64)
+def _cached_legend_line(color, linestyle, label):
+    return Line2D([0], [0], color=color, linestyle=linestyle, lw=4,
+                  label=label)
+
+
+def _legend_line(color, linestyle, label):
+    """Returns a Line2D legend proxy for a link type. The proxies are never
+    drawn or changed, so the same one is reused for the same style. Colors
+    given as lists cannot be hashed and get a new proxy every time."""
+    try:
+        return _cached_legend_line(color, linestyle, label)
+    except TypeError:
+        return Line2D([0], [0], color=color, linestyle=linestyle, lw=4,
+                      label=label)
+
+
 def draw_legend(
         self,
         ax,
@@ -644,6 +935,8 @@ def draw_legend(
         element_size_legend_title=None,
         element_size_legend_loc=None,
         element_size_legend_labels=None,
+        g=None,
+        async_=False,
         style=None):
     """Draws the legends for all other plotting functions. There are two legends that might be drawn. One is the base elements legend with displays what markers are associated with each element type (draw_nodes, draw_links, etc.) The other legend is the intervals legend which is the legend for discrete drawing. Under normal use, draw_legends is not normally called by the user directly, even with more advanced applications. However, some specialized plots may require draw_legend to be called directly.
     
@@ -676,12 +969,36 @@ def draw_legend(
     element_size_legend_labels : array-like
         The labels of each interval of the element size legend.
     
+    g : NetworkX path collection
+        The nodes drawn by draw_nodes. If given, the element size legend
+        entries are generated from it and use the same marker.
+    
     node_border_color : string
         The color of the legend draw_nodes edges when plotting element size legend.
     
     linewidths: integer
         The width of the line of the legend draw_nodes when plotting element size legend.
+    
+    async_ : boolean
+        If True, the legend is drawn on the background render thread of
+        viswaternet.utils.async_renderer and a Future is returned. The figure
+        should not be used until viswaternet.utils.async_renderer.wait() has
+        returned.
     """
+    if async_:
+        return async_renderer.submit(
+            draw_legend,
+            self,
+            ax,
+            intervals=intervals,
+            title=title,
+            element_size_intervals=element_size_intervals,
+            element_size_legend_title=element_size_legend_title,
+            element_size_legend_loc=element_size_legend_loc,
+            element_size_legend_labels=element_size_legend_labels,
+            g=g,
+            style=style)
+    model = self.model
     # If no intervals for data legend are specified, then create empty array
     if intervals is None:
         intervals = []
@@ -698,7 +1015,11 @@ def draw_legend(
     valve_arrows = args['valve_arrows']
     pump_line_style = args['pump_line_style']
     pump_arrows = args['pump_arrows']
+    pump_width = args['pump_width']
+    valve_width = args['valve_width']
+    draw_links = args['draw_links']
     base_link_color = args['base_link_color']
+    base_link_width = args['base_link_width']
     base_link_line_style = args['base_link_line_style']
     base_link_arrows = args['base_link_arrows']
     draw_base_legend = args['draw_base_legend']
@@ -727,35 +1048,35 @@ def draw_legend(
 
     # If draw_pumps is True, then add legend element. Note that right now
     # pump_arrows does not affect legend entry, but that it may in the future,
-    # hence the if statement
-    if draw_pumps and pump_element == 'link':
+    # hence the if statement. Groups that draw_base_elements skips, because
+    # they are empty or have a width of 0, get no entry either
+    if draw_pumps and pump_element == 'link' \
+            and model["G_list_pumps_only"] and np.any(pump_width):
         if pump_arrows:
-            extensions.append(Line2D([0], [0], color=pump_color,
-                              linestyle=pump_line_style, lw=4, label='Pumps'))
+            extensions.append(_legend_line(pump_color, pump_line_style,
+                                           'Pumps'))
         else:
-            extensions.append(Line2D([0], [0], color=pump_color,
-                              linestyle=pump_line_style, lw=4, label='Pumps'))
-    if draw_valves and valve_element == 'link':
+            extensions.append(_legend_line(pump_color, pump_line_style,
+                                           'Pumps'))
+    if draw_valves and valve_element == 'link' \
+            and model["G_list_valves_only"] and np.any(valve_width):
         if valve_arrows:
-            extensions.append(Line2D([0], [0], color=valve_color,
-                              linestyle=valve_line_style, lw=4,
-                              label='Valves'))
+            extensions.append(_legend_line(valve_color, valve_line_style,
+                                           'Valves'))
         else:
-            extensions.append(Line2D([0], [0], color=valve_color,
-                              linestyle=valve_line_style, lw=4,
-                              label='Valves'))
+            extensions.append(_legend_line(valve_color, valve_line_style,
+                                           'Valves'))
     # If draw_base_links is True, then add legend element. Note that right now
     # base_link_arrows does not affect legend entry, but that it may in the
     # future, hence the if statement
-    if draw_links:
+    if draw_links and model["G_pipe_name_list"] \
+            and np.any(base_link_width):
         if base_link_arrows:
-            extensions.append(Line2D([0], [0], color=base_link_color,
-                              linestyle=base_link_line_style, lw=4,
-                              label='Pipes'))
+            extensions.append(_legend_line(base_link_color,
+                                           base_link_line_style, 'Pipes'))
         else:
-            extensions.append(Line2D([0], [0], color=base_link_color,
-                              linestyle=base_link_line_style, lw=4,
-                              label='Pipes'))
+            extensions.append(_legend_line(base_link_color,
+                                           base_link_line_style, 'Pipes'))
     # Extend handles list
     handles.extend(extensions)
 
@@ -763,15 +1084,13 @@ def draw_legend(
     if intervals:
         # Draws base legend, which includes the legend for draw_reservoirs,
         # draw_tanks, and so on
-        if draw_base_legend is True:
+        if draw_base_legend is True and len(handles) > len(intervals):
             legend = ax.legend(handles=handles[len(intervals):],
                                loc=base_legend_loc,
                                fontsize=base_legend_label_font_size,
                                labelcolor=base_legend_label_color,
                                frameon=draw_legend_frame)
-            # Align legend text to the left, add legend to ax
-            legend._legend_box.align = "left"
-            ax.add_artist(legend)
+            _finalize_legend(ax, legend)
         # Draws intervals, or data, legend to the ax
         if draw_discrete_legend is True:
             if isinstance(discrete_legend_label_color, str) \
@@ -796,14 +1115,7 @@ def draw_legend(
                     for i, text in enumerate(legend2.get_texts()):
                         text.set_color(color_list[i])
                 elif cmap:
-                    try:
-                        cmap = mpl.colormaps[cmap]
-                    except Exception:
-                        if isinstance(cmap, mpl.colors.LinearSegmentedColormap) \
-                            or isinstance(cmap, mpl.colors.ListedColormap):
-                                pass
-                        else:
-                            raise Exception('Invalid cmap!')
+                    cmap = _get_cmap(self, cmap)
                     cmap_value = 1 / len(intervals)
                     for i, text in enumerate(legend2.get_texts()):
                         text.set_color(cmap(float(cmap_value)))
@@ -818,23 +1130,19 @@ def draw_legend(
                     frameon=draw_legend_frame)
                 for i, text in enumerate(legend2.get_texts()):
                     text.set_color(discrete_legend_label_color[i])
-            # Align legend text to the left, adds title, and adds to ax
-            legend2._legend_box.align = "left"
-            legend2.get_title().set_color(discrete_legend_title_color)
-            ax.add_artist(legend2)
+            _finalize_legend(ax, legend2,
+                             title_color=discrete_legend_title_color)
     # If there are no intervals, just draw base legend
     else:
         # Draws base legend, which includes the legend for draw_reservoirs,
         # draw_tanks, and so on
-        if draw_base_legend is True:
+        if draw_base_legend is True and handles:
             legend = ax.legend(handles=handles,
                                loc=base_legend_loc,
                                fontsize=base_legend_label_font_size,
                                labelcolor=base_legend_label_color,
                                frameon=draw_legend_frame)
-            # Align legend text to the left, add legend to ax
-            legend._legend_box.align = "left"
-            ax.add_artist(legend)
+            _finalize_legend(ax, legend)
 
     # The following code is for a node/link legend. This adds a 2nd dimension
     # to the data that can be plotted, by allowing for changes in size of
@@ -844,48 +1152,122 @@ def draw_legend(
     # other functions that viswaternet performs, and improvements to ease of
     # use will be made in the future.
     if node_size is not None and element_size_intervals is not None:
-        if isinstance(node_size, list):
-            handles_2 = []
-            min_size = np.min(node_size)
-            max_size = np.max(node_size)
-            marker_sizes = np.linspace(
-                min_size, max_size, element_size_intervals)
-            for size, label in zip(marker_sizes, element_size_legend_labels):
-                handles_2.append(Line2D([], [], marker='.', color='w',
-                                 markeredgecolor=node_border_color,
-                                 markeredgewidth=node_border_width,
-                                 label=label, markerfacecolor='k',
-                                 markersize=np.sqrt(size)))
-            legend3 = ax.legend(
-                handles=handles_2,
-                title=element_size_legend_title,
-                loc=element_size_legend_loc,
-                fontsize=discrete_legend_label_font_size,  # Change later!
-                title_fontsize=discrete_legend_title_font_size,
-                labelcolor=discrete_legend_label_color,
-                frameon=draw_legend_frame)
-            legend3._legend_box.align = "left"
-            ax.add_artist(legend3)
+        if isinstance(node_size, (list, np.ndarray)):
+            marker_sizes = _legend_sizes(node_size, element_size_intervals)
+            # Entries only differ in size and label, so they are copied
+            # from one prototype instead of parsing the style each time.
+            # They are built from marker_sizes rather than from the sizes
+            # in g, which may not include every size in node_size (e.g.
+            # tanks and reservoirs are drawn separately), so that entries
+            # and labels stay paired
+            if isinstance(g, mpl.collections.PathCollection):
+                prototype = Line2D([0], [0], ls="", color='k',
+                                   marker=g.get_paths()[0],
+                                   markeredgecolor=node_border_color,
+                                   markeredgewidth=g.get_linewidths()[0],
+                                   alpha=g.get_alpha())
+            else:
+                prototype = Line2D([], [], marker='.', color='w',
+                                   markeredgecolor=node_border_color,
+                                   markeredgewidth=node_border_width,
+                                   markerfacecolor='k')
+            handles_2 = [None] * min(len(marker_sizes),
+                                     len(element_size_legend_labels))
+            for i, (size, label) in enumerate(
+                    zip(marker_sizes, element_size_legend_labels)):
+                handle = copy.copy(prototype)
+                # Line2D marker sizes are in points, scatter sizes in
+                # points squared
+                handle.set_markersize(math.sqrt(size))
+                handle.set_label(label)
+                handles_2[i] = handle
+            if handles_2:
+                legend3 = ax.legend(
+                    handles=handles_2,
+                    title=element_size_legend_title,
+                    loc=element_size_legend_loc,
+                    fontsize=discrete_legend_label_font_size,  # Change later!
+                    title_fontsize=discrete_legend_title_font_size,
+                    labelcolor=discrete_legend_label_color,
+                    frameon=draw_legend_frame)
+                _finalize_legend(ax, legend3)
     if link_width is not None and element_size_intervals is not None:
-        if isinstance(link_width, list):
-            handles_2 = []
-            min_size = np.min(link_width)
-            max_size = np.max(link_width)
-            marker_sizes = np.linspace(
-                min_size, max_size, element_size_intervals)
-            for size, label in zip(marker_sizes, element_size_legend_labels):
-                handles_2.append(Line2D([], [], marker=None, color='k',
-                                 linewidth=size, label=label))
-            legend3 = ax.legend(
-                handles=handles_2,
-                title=element_size_legend_title,
-                loc=element_size_legend_loc,
-                fontsize=discrete_legend_label_font_size,
-                title_fontsize=discrete_legend_title_font_size,
-                labelcolor=discrete_legend_label_color,
-                frameon=draw_legend_frame)
-            legend3._legend_box.align = "left"
-            ax.add_artist(legend3)
+        if isinstance(link_width, (list, np.ndarray)):
+            marker_sizes = _legend_sizes(link_width, element_size_intervals)
+            prototype = Line2D([], [], marker=None, color='k')
+            handles_2 = [None] * min(len(marker_sizes),
+                                     len(element_size_legend_labels))
+            for i, (size, label) in enumerate(
+                    zip(marker_sizes, element_size_legend_labels)):
+                handle = copy.copy(prototype)
+                handle.set_linewidth(size)
+                handle.set_label(label)
+                handles_2[i] = handle
+            if handles_2:
+                legend3 = ax.legend(
+                    handles=handles_2,
+                    title=element_size_legend_title,
+                    loc=element_size_legend_loc,
+                    fontsize=discrete_legend_label_font_size,
+                    title_fontsize=discrete_legend_title_font_size,
+                    labelcolor=discrete_legend_label_color,
+                    frameon=draw_legend_frame)
+                _finalize_legend(ax, legend3)
+
+
+def _add_color_bar(
+        fig,
+        ax,
+        g,
+        color_bar_loc,
+        color_bar_label_loc,
+        color_bar_width,
+        color_bar_height):
+    """Lays out a new color bar axes next to ax and returns the colorbar."""
+    divider = make_axes_locatable(ax)
+    # Position of ax in figure coordinates, looked up once
+    x0, y0, width, height = divider.get_position()
+    if color_bar_loc == 'right':
+        cax = fig.add_axes([x0 + width + 0.02,
+                            y0 + (height * (1-color_bar_height))/2,
+                            color_bar_width,
+                            height*color_bar_height])
+        cbar = fig.colorbar(g, cax=cax)
+        if color_bar_label_loc == 'left':
+            cbar.ax.yaxis.set_label_position('left')
+        else:
+            pass
+    if color_bar_loc == 'left':
+        cax = fig.add_axes([x0 - 0.02 - color_bar_width,
+                            y0 + (height * (1-color_bar_height))/2,
+                            color_bar_width,
+                            height*color_bar_height])
+        cbar = fig.colorbar(g, cax=cax)
+        if color_bar_label_loc == 'left':
+            cbar.ax.yaxis.set_label_position('left')
+        else:
+            pass
+    if color_bar_loc == 'top':
+        cax = fig.add_axes([x0 + (width * (1-color_bar_width))/2,
+                            height + 0.15,
+                            width*color_bar_width,
+                            color_bar_height])
+        cbar = fig.colorbar(g, cax=cax, orientation='horizontal')
+        if color_bar_label_loc == 'top':
+            cbar.ax.xaxis.set_label_position('top')
+        else:
+            pass
+    if color_bar_loc == 'bottom':
+        cax = fig.add_axes([x0 + (width * (1-color_bar_width))/2,
+                            y0,
+                            width*color_bar_width,
+                            color_bar_height])
+        cbar = fig.colorbar(g, cax=cax, orientation='horizontal')
+        if color_bar_label_loc == 'top':
+            cbar.ax.xaxis.set_label_position('top')
+        else:
+            pass
+    return cbar
 
 
 def draw_color_bar(
@@ -893,6 +1275,7 @@ def draw_color_bar(
         ax,
         g,
         color_bar_title=None,
+        async_=False,
         style=None):
     """Draws the color bar for all continuous plotting functions.Like draw_legends, under normal use, draw_color_bar is not normally called by the user directly, even with more advanced applications. However, some specialized plots may require draw_color_bar to be called directly.
     
@@ -909,7 +1292,21 @@ def draw_color_bar(
     
     color_bar_title : string
         The title of the color bar.
+    
+    async_ : boolean
+        If True, the color bar is drawn on the background render thread of
+        viswaternet.utils.async_renderer and a Future is returned. The figure
+        should not be used until viswaternet.utils.async_renderer.wait() has
+        returned.
     """
+    if async_:
+        return async_renderer.submit(
+            draw_color_bar,
+            self,
+            ax,
+            g,
+            color_bar_title=color_bar_title,
+            style=style)
     # Unruly code to make colorbar location nice and symmetrical when dealing
     # with subplots especially.
     if style is None:
@@ -922,62 +1319,56 @@ def draw_color_bar(
     color_bar_label_font_size = args['color_bar_label_font_size']
     color_bar_label_font_color = args['color_bar_label_font_color']
     cmap = args['cmap']
-    divider = make_axes_locatable(ax)
-    fig = plt.gcf()
-    if color_bar_loc == 'right':
-        cax = fig.add_axes([divider.get_position()[0]+divider.get_position()[2]
-                            + 0.02, (divider.get_position()[1])
-                            + ((divider.get_position()[3]
-                                * (1-color_bar_height)))/2,
-                            color_bar_width,
-                            divider.get_position()[3]*color_bar_height])
-        cbar = fig.colorbar(g, cax=cax)
-        if color_bar_label_loc == 'left':
-            cbar.ax.yaxis.set_label_position('left')
-        else:
-            pass
-    if color_bar_loc == 'left':
-        cax = fig.add_axes([divider.get_position()[0] - 0.02 - color_bar_width,
-                            (divider.get_position()[1])
-                            + ((divider.get_position()[3]
-                                * (1-color_bar_height)))/2,
-                            color_bar_width,
-                            divider.get_position()[3]*color_bar_height])
-        cbar = fig.colorbar(g, cax=cax)
-        if color_bar_label_loc == 'left':
-            cbar.ax.yaxis.set_label_position('left')
-        else:
-            pass
-    if color_bar_loc == 'top':
-        cax = fig.add_axes([(divider.get_position()[0])
-                            + (divider.get_position()[2]
-                               * (1-color_bar_width))/2,
-                            divider.get_position()[3] + 0.15,
-                            divider.get_position()[2]*color_bar_width,
-                            color_bar_height])
-        cbar = fig.colorbar(g, cax=cax, orientation='horizontal')
-        if color_bar_label_loc == 'top':
-            cbar.ax.xaxis.set_label_position('top')
-        else:
-            pass
-    if color_bar_loc == 'bottom':
-        cax = fig.add_axes([(divider.get_position()[0])
-                            + (divider.get_position()[2]
-                               * (1-color_bar_width))/2,
-                            divider.get_position()[1],
-                            divider.get_position()[2]*color_bar_width,
-                            color_bar_height])
-        cbar = fig.colorbar(g, cax=cax, orientation='horizontal')
-        if color_bar_label_loc == 'top':
-            cbar.ax.xaxis.set_label_position('top')
-        else:
-            pass
+    fig = ax.figure
+    # A color bar drawn earlier on the same axes with the same layout is
+    # pointed at the new mappable instead of being laid out again, so
+    # redraws in a loop don't stack color bars on top of each other. Color
+    # bars with other layouts are left alone
+    layout = (color_bar_loc, color_bar_label_loc, color_bar_width,
+              color_bar_height)
+    if not hasattr(ax, "_viswaternet_cbars"):
+        ax._viswaternet_cbars = {}
+    cbar = ax._viswaternet_cbars.get(layout)
+    if cbar is not None and cbar.ax in fig.axes:
+        # Move the colorbar's change callback over to the new mappable, as
+        # fig.colorbar does, so the old one no longer drives it
+        previous = cbar.mappable
+        previous.callbacks.disconnect(previous.colorbar_cid)
+        previous.colorbar = None
+        cbar.update_normal(g)
+        g.colorbar = cbar
+        g.colorbar_cid = g.callbacks.connect('changed', cbar.update_normal)
+    else:
+        cbar = _add_color_bar(fig, ax, g, color_bar_loc, color_bar_label_loc,
+                              color_bar_width, color_bar_height)
+        ax._viswaternet_cbars[layout] = cbar
     cbar.set_label(color_bar_title, fontsize=10)
     cbar.ax.yaxis.label.set_fontsize(color_bar_label_font_size)
     cbar.ax.yaxis.label.set_color(color_bar_label_font_color)
     cbar.ax.xaxis.label.set_fontsize(color_bar_label_font_size)
     cbar.ax.xaxis.label.set_color(color_bar_label_font_color)
 
+def _draw_label_arrows(ax, segments):
+    """Draws the arrows from nodes to their labels as one LineCollection.
+    The data limits grow around each arrow the same way they do when
+    nxp.draw_networkx_edges draws the arrows one at a time."""
+    collection = mpl.collections.LineCollection(
+        segments,
+        colors="g",
+        linewidths=0.8,
+        antialiaseds=(1,))
+    # Arrows go behind nodes
+    collection.set_zorder(1)
+    ax.add_collection(collection)
+    lower = segments.min(axis=1)
+    upper = segments.max(axis=1)
+    padding = 0.05 * (upper - lower)
+    ax.update_datalim(np.concatenate((lower - padding, upper + padding)))
+    ax.autoscale_view()
+    ax.tick_params(axis="both", which="both", bottom=False, left=False,
+                   labelbottom=False, labelleft=False)
+
+
 def draw_label(
         self,
         labels,
@@ -1036,65 +1427,53 @@ def draw_label(
     model = self.model
     if ax is None:
         ax = self.ax
+    # The same box style is used for every label, matplotlib copies it
+    bbox = dict(facecolor=label_face_color,
+                alpha=label_alpha,
+                edgecolor=label_edge_color,
+                lw=label_edge_width)
     if draw_nodes is not None:
-        for label, node, xCoord, yCoord in \
-                zip(labels, draw_nodes, x_coords, y_coords):
-            if draw_arrow:
-                edge_list = []
-                if label == node:
-                    pass
-                else:
-                    model["G"].add_node(label, pos=(xCoord, yCoord))
-                    model["pos_dict"][label] = (
-                        model["wn"].get_node(node).coordinates[0] + xCoord,
-                        model["wn"].get_node(node).coordinates[1] + yCoord)
-                    edge_list.append((node, label))
-                    nxp.draw_networkx_edges(
-                        model["G"], model["pos_dict"], edgelist=edge_list,
-                        edge_color="g", width=0.8, arrows=False)
-                    model["G"].remove_node(label)
-                    model["pos_dict"].pop(label, None)
-                    edge_list.append((node, label))
-            if draw_arrow is True:
-                if xCoord < 0:
-                    ax.text(
-                        model["wn"].get_node(node).coordinates[0] + xCoord,
-                        model["wn"].get_node(node).coordinates[1] + yCoord,
-                        s=label,
-                        color=label_text_color,
-                        style=label_font_style,
-                        bbox=dict(facecolor=label_face_color,
-                                  alpha=label_alpha,
-                                  edgecolor=label_edge_color,
-                                  lw=label_edge_width),
-                        horizontalalignment="right",
-                        verticalalignment="center",
-                        fontsize=label_font_size)
-                if xCoord >= 0:
-                    ax.text(
-                        model["wn"].get_node(node).coordinates[0] + xCoord,
-                        model["wn"].get_node(node).coordinates[1] + yCoord,
-                        s=label,
-                        color=label_text_color,
-                        style=label_font_style,
-                        bbox=dict(facecolor=label_face_color,
-                                  alpha=label_alpha,
-                                  edgecolor=label_edge_color,
-                                  lw=label_edge_width),
-                        horizontalalignment="left",
-                        verticalalignment="center",
-                        fontsize=label_font_size)
-            else:
-                ax.text(
-                    model["wn"].get_node(node).coordinates[0] + xCoord,
-                    model["wn"].get_node(node).coordinates[1] + yCoord,
-                    s=label, color=label_text_color, style=label_font_style,
-                    bbox=dict(facecolor=label_face_color,
-                              alpha=label_alpha, edgecolor=label_edge_color,
-                              lw=label_edge_width),
-                    horizontalalignment="center",
-                    verticalalignment="center", fontsize=label_font_size)
-    elif draw_nodes is None:
+        # Extra labels, nodes or coordinates are ignored, as zip would
+        count = min(len(labels), len(draw_nodes), len(x_coords),
+                    len(y_coords))
+        labels = labels[:count]
+        draw_nodes = draw_nodes[:count]
+        x_coords = x_coords[:count]
+        y_coords = y_coords[:count]
+        # Label positions are offset from the coordinates of their nodes
+        node_index = model["node_index"]
+        node_coordinates = model["node_coordinates"][
+            [node_index[node] for node in draw_nodes]]
+        offsets = np.column_stack((np.asarray(x_coords, dtype=np.float64),
+                                   np.asarray(y_coords, dtype=np.float64)))
+        anchors, right = _label_anchors(node_coordinates, offsets)
+        # Labels with arrows sit to the side of the arrow's end, indexed by
+        # whether the label is right of its node. Others are centered on
+        # their position
+        if draw_arrow is True:
+            ha_table = ("right", "left")
+        else:
+            ha_table = ("center", "center")
+        # Arrows from each node to its label, drawn together after the loop
+        arrows = []
+        for label, node, is_right, start, (x, y) in \
+                zip(labels, draw_nodes, right.tolist(),
+                    node_coordinates.tolist(), anchors.tolist()):
+            if draw_arrow and label != node:
+                arrows.append((start, (x, y)))
+            ax.text(
+                x,
+                y,
+                s=label,
+                color=label_text_color,
+                style=label_font_style,
+                bbox=bbox,
+                horizontalalignment=ha_table[is_right],
+                verticalalignment="center",
+                fontsize=label_font_size)
+        if arrows:
+            _draw_label_arrows(ax, np.array(arrows))
+    else:
         for label, xCoord, yCoord in zip(labels, x_coords, y_coords):
             ax.text(
                 xCoord,
@@ -1102,10 +1481,7 @@ def draw_label(
                 s=label,
                 color=label_text_color,
                 style=label_font_style,
-                bbox=dict(facecolor=label_face_color,
-                          alpha=label_alpha,
-                          edgecolor=label_edge_color,
-                          lw=label_edge_width),
+                bbox=bbox,
                 horizontalalignment="center",
                 fontsize=label_font_size,
                 transform=ax.transAxes)
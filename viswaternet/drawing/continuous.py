@@ -76,6 +76,8 @@ def plot_continuous_nodes(
             'mean'              Plots mean for each element
             'stddev'            Plots standard deviation for each element
             'range'             Plots range for each element
+            function            Plots result of function (e.g. np.median)
+                                applied over time for each element
         ======================= =========================================
     
     unit : string
@@ -125,6 +127,7 @@ def plot_continuous_nodes(
         self.fig = fig
         self.ax = ax
         ax.set_frame_on(self.axis_frame)
+    g = None
     if parameter is not None:
         if not isinstance(value, list):
             parameter_results, node_list = processing.get_parameter(
@@ -170,6 +173,7 @@ def plot_continuous_nodes(
                      element_size_legend_title=element_size_legend_title,
                      element_size_legend_loc=element_size_legend_loc,
                      element_size_legend_labels=element_size_legend_labels,
+                     g=g,
                      style=style)
     if savefig:
         save_fig(self, save_name=save_name, style=style)
@@ -240,6 +244,8 @@ def plot_continuous_links(
             'mean'              Plots mean for each element
             'stddev'            Plots standard deviation for each element
             'range'             Plots range for each element
+            function            Plots result of function (e.g. np.median)
+                                applied over time for each element
         ======================= =========================================
     
     unit : string
@@ -4,7 +4,6 @@ The viswaternet.drawing.discrete module handles everything related to discrete d
 """
 
 import numpy as np
-import matplotlib as mpl
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
 import networkx.drawing.nx_pylab as nxp
@@ -99,14 +98,7 @@ def draw_discrete_nodes(
                               label=label_list[j])
                 ax.add_artist(m)          
     else:
-        try:
-            cmap = mpl.colormaps[cmap]
-        except Exception:
-            if isinstance(cmap, mpl.colors.LinearSegmentedColormap) \
-                or isinstance(cmap, mpl.colors.ListedColormap):
-                    pass
-            else:
-                raise Exception('Invalid cmap!')
+        cmap = base._get_cmap(self, cmap)
         cmapValue = 1 / len(intervals)
         for j, interval_name in enumerate(intervals):
             interval_elements = element_list.get(interval_name)
@@ -207,14 +199,7 @@ def draw_discrete_links(
                     style=link_style[j],
                     label=label_list[j])    
     else:
-        try:
-            cmap = mpl.colormaps[cmap]
-        except Exception:
-            if isinstance(cmap, mpl.colors.LinearSegmentedColormap) \
-                or isinstance(cmap, mpl.colors.ListedColormap):
-                    pass
-            else:
-                raise Exception('Invalid cmap!')
+        cmap = base._get_cmap(self, cmap)
         cmapValue = 1 / len(intervals)
         for j, interval_name in enumerate(intervals):
             interval_elements = element_list.get(interval_name)
@@ -321,6 +306,8 @@ def plot_discrete_nodes(
             'mean'              Plots mean for each element
             'stddev'            Plots standard deviation for each element
             'range'             Plots range for each element
+            function            Plots result of function (e.g. np.median)
+                                applied over time for each element
         ======================= =========================================
         
     unit : string
@@ -491,6 +478,8 @@ def plot_discrete_links(
             'mean'              Plots mean for each element
             'stddev'            Plots standard deviation for each element
             'range'             Plots range for each element
+            function            Plots result of function (e.g. np.median)
+                                applied over time for each element
         ======================= =========================================
         
     unit : string
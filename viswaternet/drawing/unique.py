@@ -35,6 +35,9 @@ def plot_unique_data(
         element_size_legend_loc=None,
         element_size_legend_labels=None,
         disable_interval_deleting=True,
+        backend="matplotlib",
+        rasterize_nodes=False,
+        aggregate_when_oversampled=False,
         style=None):
     """A complex function that accomplishes tasks relating to categorical data, or 'unique' as used in viswaternet, as well as data not retrieved from WNTR.
     
@@ -330,6 +333,25 @@ def plot_unique_data(
     
     save_format : string
         The file format that the figure will be saved as.
+    
+    backend : string
+        Either 'matplotlib' or 'datashader'. Only used for continuous data.
+        The datashader backend draws all nodes or links as a single
+        rasterized image, which is much faster for very large networks.
+        Requires the datashader package.
+    
+    rasterize_nodes : boolean
+        Only used for continuous nodal data. If True, the nodes are embedded
+        as a single image when the figure is saved to a vector format (pdf,
+        svg) while the links, legends, and color bar stay as vectors. This
+        keeps vector exports of large networks small. Use a dpi of 200 or more
+        in the style for print quality.
+    
+    aggregate_when_oversampled : boolean
+        Only used for continuous nodal data. If True, nodes that fall on the
+        same pixel are drawn as a single node colored by their mean value, so
+        drawing time is bounded by the figure resolution rather than by the
+        size of the network.
     """
 
     model = self.model
@@ -356,7 +378,7 @@ def plot_unique_data(
                                 draw_originator=parameter_type,
                                 style=style)
 
-    def call_draw_legend(intervals=None, element_list=None):
+    def call_draw_legend(intervals=None, element_list=None, g=None):
         draw_links = True
         if parameter_type == 'link' \
                 or parameter == 'diameter' \
@@ -380,6 +402,7 @@ def plot_unique_data(
             element_size_legend_title=element_size_legend_title,
             element_size_legend_loc=element_size_legend_loc,
             element_size_legend_labels=element_size_legend_labels,
+            g=g,
             style=style)
 
     def call_draw_color_bar():
@@ -405,8 +428,7 @@ def plot_unique_data(
     elif parameter == "diameter" or parameter == "roughness":
         parameter_results, link_list = processing.get_parameter(
             self, "link", parameter)
-        link_list = [link_list[link_list.index(name)]
-                     for name in link_list
+        link_list = [name for name in link_list
                      if ((name not in model["pump_names"]
                           or pump_element == 'node'
                           or draw_pumps is False)
@@ -424,11 +446,11 @@ def plot_unique_data(
         interval_results = {}
         for interval_name in interval_names:
             interval_results[interval_name] = {}
+        link_index = model["link_index"]
         for i, link in enumerate(link_list):
             interval_results["{:.{j}f}".format(
                 parameter_results[i],
-                j=legend_decimal_places)][link] = \
-                model["G_pipe_name_list"].index(link)
+                j=legend_decimal_places)][link] = link_index[link]
         # return interval_results,parameter_results,uniques
         discrete.draw_discrete_links(
             self,
@@ -457,14 +479,12 @@ def plot_unique_data(
         interval_results = {}
         for interval_name in interval_names:
             interval_results[interval_name] = {}
+        node_index = model["node_index"]
         for i, node in enumerate(node_list):
             if parameter_results[i] is None:
-                interval_results["No Tag"][node] = model["node_names"].index(
-                    node)
+                interval_results["No Tag"][node] = node_index[node]
                 continue
-            interval_results[parameter_results[i]][node] = model[
-                "node_names"
-            ].index(node)
+            interval_results[parameter_results[i]][node] = node_index[node]
         discrete.draw_discrete_nodes(
             self,
             ax,
@@ -489,7 +509,7 @@ def plot_unique_data(
                         custom_data_values[0],
                         custom_data_values[1]):
                     interval_results[data][element] = \
-                        model["node_names"].index(element)
+                        model["node_index"][element]
                 discrete.draw_discrete_nodes(
                     self,
                     ax,
@@ -502,7 +522,7 @@ def plot_unique_data(
                         custom_data_values[0],
                         custom_data_values[1]):
                     interval_results[data][element] = \
-                        model["G_pipe_name_list"].index(element)
+                        model["link_index"][element]
                 discrete.draw_discrete_links(
                     self,
                     ax,
@@ -563,6 +583,7 @@ def plot_unique_data(
                     parameter_results=parameter_results,
                     vmin=vmin,
                     vmax=vmax,
+                    backend=backend,
                     style=style)
                 call_draw_base_elements(element_list=custom_data_values[0])
                 call_draw_legend(element_list=custom_data_values[0])
@@ -572,16 +593,26 @@ def plot_unique_data(
                                                   custom_data_values[0])
                 else:
                     parameter_results = custom_data_values[1]
+                node_list = custom_data_values[0]
+                node_size = args['node_size']
+                if aggregate_when_oversampled:
+                    node_list, parameter_results, node_size = \
+                        base._aggregate_oversampled_nodes(
+                            self, ax, node_list, parameter_results, node_size,
+                            style=style)
                 g = base.draw_nodes(
                     self,
                     ax,
-                    custom_data_values[0],
+                    node_list,
                     parameter_results=parameter_results,
+                    node_size=node_size,
                     vmin=vmin,
                     vmax=vmax,
+                    backend=backend,
+                    rasterized=rasterize_nodes,
                     style=style)
                 call_draw_base_elements(element_list=custom_data_values[0])
-                call_draw_legend(element_list=custom_data_values[0])
+                call_draw_legend(element_list=custom_data_values[0], g=g)
             if draw_color_bar is True:
                 call_draw_color_bar()
             if savefig:
@@ -686,20 +717,31 @@ def plot_unique_data(
                     results,
                     vmin=vmin,
                     vmax=vmax,
+                    backend=backend,
                     style=style)
                 call_draw_base_elements(element_list=element_list)
                 call_draw_legend(element_list=element_list)
             elif parameter_type == "node":
+                node_list = element_list
+                node_size = args['node_size']
+                if aggregate_when_oversampled:
+                    node_list, results, node_size = \
+                        base._aggregate_oversampled_nodes(
+                            self, ax, node_list, results, node_size,
+                            style=style)
                 g = base.draw_nodes(
                     self,
                     ax,
-                    element_list,
+                    node_list,
                     results,
+                    node_size=node_size,
                     vmin=vmin,
                     vmax=vmax,
+                    backend=backend,
+                    rasterized=rasterize_nodes,
                     style=style)
                 call_draw_base_elements(element_list=element_list)
-                call_draw_legend(element_list=element_list)
+                call_draw_legend(element_list=element_list, g=g)
             if draw_color_bar is True:
                 call_draw_color_bar()
             if savefig:
@@ -1,2 +1,3 @@
 from .initialize import VisWNModel
-from .processing import bin_parameter, get_parameter, get_demand_patterns
\ No newline at end of file
+from .processing import bin_parameter, get_parameter, get_demand_patterns, \
+    run_scenarios
\ No newline at end of file
@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 import os
+import pickle
+import tempfile
+import hashlib
 import wntr
 import numpy as np
+import pandas as pd
 from packaging.version import parse
 from viswaternet.drawing.style import NetworkStyle as style
 class VisWNModel:
@@ -9,7 +13,9 @@ class VisWNModel:
                  inp_file=None,
                  network_model=None,
                  figsize=(12, 12),
-                 axis_frame=False):
+                 axis_frame=False,
+                 cache_results=False,
+                 cache_dir=None):
         model = {}
         dirname = os.getcwd()
 
@@ -29,8 +35,57 @@ class VisWNModel:
         model["wn"] = wn
         sim = wntr.sim.EpanetSimulator(wn)
         model["sim"] = sim
-        results = sim.run_sim()
+        # If cache_results is True, simulation results are stored on disk
+        # keyed by the contents of the .inp file so that later runs on the
+        # same network skip the simulation. Networks passed in as WNTR
+        # models may have been changed in memory, so they are never cached.
+        results = None
+        cache_file = None
+        if cache_results and network_model is None:
+            if cache_dir is None:
+                cache_dir = os.path.join(os.path.expanduser("~"), ".cache",
+                                         "viswaternet")
+            with open(inp_file, "rb") as f:
+                inp_hash = hashlib.blake2b(f.read())
+            # Results are pickled pandas objects, so a cache written under
+            # other library versions is not reused
+            for version in (wntr.__version__, pd.__version__,
+                            np.__version__):
+                inp_hash.update(str(version).encode())
+            cache_file = os.path.join(cache_dir,
+                                      inp_hash.hexdigest() + ".pkl")
+            if os.path.isfile(cache_file):
+                # A cache file that can't be read, e.g. left truncated by
+                # an interrupted run or written by other library versions,
+                # is treated as a cache miss
+                try:
+                    with open(cache_file, "rb") as f:
+                        results = pickle.load(f)
+                except Exception:
+                    results = None
+        if results is None:
+            results = sim.run_sim()
+            if cache_file is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                # Written to a temporary file first and moved into place,
+                # so the cache file is never seen half written
+                fd, temp_file = tempfile.mkstemp(dir=cache_dir,
+                                                 suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        pickle.dump(results, f)
+                    os.replace(temp_file, cache_file)
+                except BaseException:
+                    os.remove(temp_file)
+                    raise
         model["results"] = results
+        # Per-parameter result arrays and summary statistics, filled in
+        # lazily by get_parameter
+        model["timeseries"] = {}
+        model["summary_statistics"] = {}
+        # Colormaps looked up by name, filled in lazily by the drawing
+        # functions
+        model["cmaps"] = {}
         # =====================================================================
         #   Create name lists for easy reference
         #   junc_names excludes resevoirs and tanks
@@ -62,6 +117,12 @@ class VisWNModel:
 
             pos_dict[name] = node.coordinates
         model["pos_dict"] = pos_dict
+        # Coordinates of all nodes as one (N, 2) array, ordered like
+        # node_names, and the position of each node in it
+        model["node_coordinates"] = np.array(
+            [pos_dict[name] for name in wn.node_name_list], dtype=np.float64)
+        model["node_index"] = {
+            name: i for i, name in enumerate(wn.node_name_list)}
 
         G_pipe_name_list = np.array(wn.link_name_list)
         G_list_pumps_only_mask = np.isin(np.array(G_pipe_name_list),
@@ -71,14 +132,30 @@ class VisWNModel:
         G_list_pumps_only = np.array(pipe_list)[G_list_pumps_only_mask]
         G_list_valves_only = np.array(pipe_list)[G_list_valves_only_mask]
         model["G_pipe_name_list"] = G_pipe_name_list.tolist()
+        # Position of each link in G_pipe_name_list, so lookups by name
+        # don't scan the list
+        model["link_index"] = {
+            name: i for i, name in enumerate(model["G_pipe_name_list"])}
+        # Start and end coordinates of every link as an (E, 2, 2) array,
+        # ordered like G_pipe_name_list
+        node_index = model["node_index"]
+        model["link_segments"] = model["node_coordinates"][
+            np.array([[node_index[start], node_index[end]]
+                      for start, end in pipe_list],
+                     dtype=np.intp).reshape(-1, 2)]
         model["G_list_pumps_only"] = G_list_pumps_only.tolist()
         model["G_list_valves_only"] = G_list_valves_only.tolist()
+        # Midpoints of pump and valve links, where they are drawn as nodes
+        link_midpoints = model["link_segments"].mean(axis=1)
+        model["pump_midpoints"] = link_midpoints[G_list_pumps_only_mask]
+        model["valve_midpoints"] = link_midpoints[G_list_valves_only_mask]
 
         self.model = model
         self.figsize = figsize
         self.axis_frame = axis_frame
         self.default_style = style()
-    from viswaternet.network.processing import get_parameter, bin_parameter
+    from viswaternet.network.processing import get_parameter, bin_parameter, \
+        run_scenarios
     from viswaternet.drawing.base import draw_nodes, draw_links, \
         draw_base_elements, plot_basic_elements, draw_label, draw_legend, \
         draw_color_bar
@@ -1,5 +1,166 @@
 # -*- coding: utf-8 -*-
+import os
+import tempfile
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import wntr
 import numpy as np
+import pandas as pd
+
+
+def _mean_and_m2(values):
+    """Returns the mean and the sum of squared deviations from the mean of
+    every column of a (timesteps, elements) array, accumulated in double
+    precision."""
+    mean = values.mean(axis=0, dtype=np.float64)
+    m2 = np.var(values, axis=0, dtype=np.float64) * values.shape[0]
+    return mean, m2
+
+
+def _blocked_statistics(values, block_size=1024):
+    """Returns the (count, mean, M2) triple of every column of a
+    (timesteps, elements) array. Rows are reduced in blocks of block_size
+    timesteps, and the blocks are merged with Chan's formula. Temporaries
+    therefore scale with the block rather than the whole simulation."""
+    statistics = None
+    for start in range(0, values.shape[0], block_size):
+        block = values[start:start + block_size]
+        mean, m2 = _mean_and_m2(block)
+        block_statistics = (block.shape[0], mean, m2)
+        if statistics is None:
+            statistics = block_statistics
+        else:
+            statistics = _combine_statistics(statistics, block_statistics)
+    return statistics
+
+
+def _timeseries(self, parameter_type, parameter, dtype=np.float32):
+    """Returns the simulation results of a parameter as a (timesteps,
+    elements) array along with the element names. The array is cached on the
+    model so that repeated reductions of the same parameter share one
+    buffer. Results are only used for plotting, so the buffer is single
+    precision by default, which halves the memory read by each reduction.
+    Raises a KeyError if the parameter is not a simulation result."""
+    model = self.model
+    key = (parameter_type, parameter, np.dtype(dtype).str)
+    if key not in model["timeseries"]:
+        if parameter_type == "node":
+            data = model["results"].node[parameter]
+        else:
+            data = model["results"].link[parameter]
+        model["timeseries"][key] = (data.to_numpy(dtype=dtype), data.columns)
+    return model["timeseries"][key]
+
+
+def _summary_statistics(self, parameter_type, parameter):
+    """Returns the number of timesteps, the mean, and the sum of squared
+    deviations from the mean of a simulation result for every element.
+
+    Both moments are computed in a single pass over the time series and are
+    cached on the model, so asking for the mean and then the standard
+    deviation of the same parameter only reads the results once.
+    """
+    model = self.model
+    key = (parameter_type, parameter)
+    if key not in model["summary_statistics"]:
+        values, elements = _timeseries(self, parameter_type, parameter)
+        # Accumulate in double precision for stability even though the
+        # buffer itself is single precision
+        count, mean, m2 = _blocked_statistics(values)
+        model["summary_statistics"][key] = (
+            count,
+            pd.Series(mean, index=elements),
+            pd.Series(m2, index=elements))
+    return model["summary_statistics"][key]
+
+
+def _reduce_timeseries(self, parameter_type, parameter, value):
+    """Applies a reduction along the time axis of a simulation result and
+    returns a Series indexed by element name. value is either 'max', 'min',
+    'range', or a function that accepts an axis argument such as np.median.
+    """
+    values, elements = _timeseries(self, parameter_type, parameter)
+    reductions = {"max": np.max, "min": np.min, "range": np.ptp}
+    reduction = reductions.get(value, value)
+    return pd.Series(reduction(values, axis=0), index=elements)
+
+
+def _combine_statistics(a, b):
+    """Combines two (count, mean, M2) triples into the triple of the pooled
+    data using Chan's parallel variance formula."""
+    count_a, mean_a, m2_a = a
+    count_b, mean_b, m2_b = b
+    count = count_a + count_b
+    delta = mean_b - mean_a
+    mean = mean_a + delta * count_b / count
+    m2 = m2_a + m2_b + delta ** 2 * count_a * count_b / count
+    return count, mean, m2
+
+
+def _scenario_statistics(network_model, parameter_type, parameter):
+    """Simulates a single scenario and returns the element names and the
+    (count, mean, M2) triple of the parameter time series. Each scenario is
+    run in its own temporary directory so that EPANET's files from parallel
+    runs do not overwrite each other."""
+    with tempfile.TemporaryDirectory() as directory:
+        sim = wntr.sim.EpanetSimulator(network_model)
+        results = sim.run_sim(file_prefix=os.path.join(directory, "temp"))
+    if parameter_type == "node":
+        data = results.node[parameter]
+    else:
+        data = results.link[parameter]
+    return list(data.columns), _blocked_statistics(data.to_numpy())
+
+
+def run_scenarios(
+        self,
+        scenarios,
+        parameter_type,
+        parameter,
+        n_jobs=None):
+    """Simulates several scenarios of the network and returns the mean and
+    standard deviation of a time-dependent parameter over all timesteps of
+    all scenarios.
+
+    Arguments
+    ---------
+    scenarios : array-like
+        List of WNTR WaterNetworkModel objects, one for each scenario. All
+        scenarios must have the same nodes and links.
+
+    parameter_type : string
+        Type of parameter (node, link)
+
+    parameter : string
+        The time-dependent parameter to summarize (pressure, flowrate, etc.)
+
+    n_jobs : integer
+        The number of processes used to run the scenarios. Defaults to the
+        number of CPUs. EPANET is not thread-safe, so scenarios are run in
+        separate processes rather than threads.
+
+    Returns
+    -------
+    mean, stddev : pandas.Series
+        The mean and standard deviation of the parameter for each element,
+        indexed by element name.
+    """
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+    run = functools.partial(_scenario_statistics,
+                            parameter_type=parameter_type,
+                            parameter=parameter)
+    if n_jobs == 1 or len(scenarios) == 1:
+        scenario_results = [run(scenario) for scenario in scenarios]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            scenario_results = list(executor.map(run, scenarios))
+    element_list = scenario_results[0][0]
+    count, mean, m2 = functools.reduce(
+        _combine_statistics,
+        [statistics for elements, statistics in scenario_results])
+    return (pd.Series(mean, index=element_list),
+            pd.Series(np.sqrt(m2 / count), index=element_list))
 
 
 def get_parameter(
@@ -20,7 +181,8 @@ def get_parameter(
         if element_list is None:
             element_list = list.copy(model["node_names"])
         # Get indices of nodes in model["node_names"]
-        indices = [model["node_names"].index(i) for i in element_list]
+        node_index = model["node_index"]
+        indices = [node_index[i] for i in element_list]
         # WNTR differentiates between node attributes and simulation results.
         # To account for this all simulation result logic is put into a try
         # block and if a KeyError occurs, it goes into the except block to
@@ -31,26 +193,18 @@ def get_parameter(
             if value is None:
                 parameter_results = results.node[parameter].iloc[:, indices]
             else:
-                if value == "max":
-                    parameter_results = np.max(
-                        results.node[parameter].iloc[:, indices],
-                        axis=0)
-                elif value == "min":
-                    parameter_results = np.min(
-                        results.node[parameter].iloc[:, indices],
-                        axis=0)
+                if value in ("max", "min", "range") or callable(value):
+                    parameter_results = _reduce_timeseries(
+                        self, "node", parameter, value).iloc[indices]
                 elif value == "mean":
-                    parameter_results = np.mean(
-                        results.node[parameter].iloc[:, indices],
-                        axis=0)
+                    count, mean, m2 = _summary_statistics(
+                        self, "node", parameter)
+                    parameter_results = mean.iloc[indices].astype(np.float32)
                 elif value == "stddev":
-                    parameter_results = np.std(
-                        results.node[parameter].iloc[:, indices],
-                        axis=0)
-                elif value == "range":
-                    parameter_results = np.ptp(
-                        results.node[parameter].iloc[:, indices],
-                        axis=0)
+                    count, mean, m2 = _summary_statistics(
+                        self, "node", parameter)
+                    parameter_results = np.sqrt(
+                        m2 / count).iloc[indices].astype(np.float32)
                 # If an int is given, assume it is a timestep and get parameter
                 # at given timestep
                 elif isinstance(value, int):
@@ -59,19 +213,13 @@ def get_parameter(
         # Node attribute fetching logic
         except KeyError:
             parameter_results = model["wn"].query_node_attribute(parameter)
-            elements_in_results = list(parameter_results.index)
-            element_list_temp = list.copy(element_list)
             # Some elements do not have certain attributes. For instance,
             # reservoirs do not have an elevation. This code removes those
             # elements from the results
-            for element in element_list_temp:
-                try:
-                    if elements_in_results.index(element):
-                        pass
-                except ValueError:
-                    element_list.remove(element)
-            indices = [elements_in_results.index(i) for i in element_list]
-            parameter_results = parameter_results.iloc[indices]
+            indices = parameter_results.index.get_indexer(element_list)
+            element_list[:] = [element for element, i
+                               in zip(element_list, indices) if i != -1]
+            parameter_results = parameter_results.iloc[indices[indices != -1]]
         if include_tanks:
             pass
         else:
@@ -99,7 +247,8 @@ def get_parameter(
         # the model
         if element_list is None:
             element_list = list.copy(model["G_pipe_name_list"])
-        indices = [model["G_pipe_name_list"].index(i) for i in element_list]
+        link_index = model["link_index"]
+        indices = [link_index[i] for i in element_list]
         # WNTR differentiates between link attributes and simulation results.
         # To account for this all simulation result logic is put into a try
         # block and if a KeyError occurs, it goes into the except block to
@@ -108,45 +257,31 @@ def get_parameter(
             if value is None:
                 parameter_results = results.link[parameter].iloc[:, indices]
             else:
-                if value == "max":
-                    parameter_results = np.max(
-                        results.link[parameter].iloc[:, indices],
-                        axis=0)
-                elif value == "min":
-                    parameter_results = np.min(
-                        results.link[parameter].iloc[:, indices],
-                        axis=0)
+                if value in ("max", "min", "range") or callable(value):
+                    parameter_results = _reduce_timeseries(
+                        self, "link", parameter, value).iloc[indices]
                 elif value == "mean":
-                    parameter_results = np.mean(
-                        results.link[parameter].iloc[:, indices],
-                        axis=0)
+                    count, mean, m2 = _summary_statistics(
+                        self, "link", parameter)
+                    parameter_results = mean.iloc[indices].astype(np.float32)
                 elif value == "stddev":
-                    parameter_results = np.std(
-                        results.link[parameter].iloc[:, indices],
-                        axis=0)
-                elif value == "range":
-                    parameter_results = np.ptp(
-                        results.link[parameter].iloc[:, indices],
-                        axis=0)
+                    count, mean, m2 = _summary_statistics(
+                        self, "link", parameter)
+                    parameter_results = np.sqrt(
+                        m2 / count).iloc[indices].astype(np.float32)
                 elif type(value) == int:
                     parameter_results = (
                         results.link[parameter].iloc[value, indices])
         # Link attribute fetching logic
         except KeyError:
             parameter_results = model["wn"].query_link_attribute(parameter)
-            elements_in_results = list(parameter_results.index)
-            element_list_temp = list.copy(element_list)
             # Some elements do not have certain attributes. For instance,
             # reservoirs do not have an elevation. This code removes those
             # elements from the results
-            for element in element_list_temp:
-                try:
-                    if elements_in_results.index(element):
-                        pass
-                except ValueError:
-                    element_list.remove(element)
-            indices = [elements_in_results.index(i) for i in element_list]
-            parameter_results = parameter_results.iloc[indices]
+            indices = parameter_results.index.get_indexer(element_list)
+            element_list[:] = [element for element, i
+                               in zip(element_list, indices) if i != -1]
+            parameter_results = parameter_results.iloc[indices[indices != -1]]
         if include_pumps:
             pass
         else:
@@ -202,8 +337,7 @@ def get_demand_patterns(self):
     for i, junc_name in enumerate(model["junc_names"]):
         for pattern in patterns:
             if demand_patterns[i] == pattern:
-                demand_pattern_nodes[pattern][junc_name] = \
-                    model["junc_names"].index(junc_name)
+                demand_pattern_nodes[pattern][junc_name] = i
 
     # Remove None key if no junctions are in it
     if len(demand_pattern_nodes['None']) == 0:
@@ -235,82 +369,55 @@ def bin_parameter(
         intervals = np.linspace(
             np.min(parameter_results), np.max(parameter_results), bins)
         intervals = intervals.tolist()
-    interval_results = {}
-    interval_names = []
     elements_with_parameter = element_list
-    element_type = None
-    for element_with_parameter in elements_with_parameter:
-        if (element_with_parameter in model["node_names"]) is True:
-            continue
-        else:
-            element_list = model["G_pipe_name_list"]
-            element_type = "link"
-            break
-    if element_type != "link":
-        element_list = model["node_names"]
-    for i in range(len(intervals)):
-        if i == 0:
-            if np.min(parameter_results) < intervals[i]:
-                interval_names.append("< {0:1.{j}f}".format(
-                    intervals[i],
-                    j=legend_decimal_places))
-            interval_names.append("{0:1.{j}f} - {1:1.{j}f}".format(
-                intervals[i], intervals[i + 1],
-                j=legend_decimal_places))
-        elif i < len(intervals) - 1:
-            interval_names.append("{0:1.{j}f} - {1:1.{j}f}".format(
-                intervals[i], intervals[i + 1],
-                j=legend_decimal_places))
-        elif i == len(intervals) - 1:
-            if np.max(parameter_results) > intervals[i]:
-                interval_names.append("> {0:1.{j}f}".format(
-                    intervals[i],
-                    j=legend_decimal_places))
+    # Elements are nodes unless any of them is not a node name
+    element_index = model["node_index"]
+    if not all(element in element_index
+               for element in elements_with_parameter):
+        element_index = model["link_index"]
+    # Bin 0 holds values below the first edge, bin len(intervals) holds
+    # values above the last edge, and bin i holds values in
+    # [intervals[i-1], intervals[i]). The last interval is closed on the
+    # right so that the maximum value is not pushed into the "above" bin.
+    parameter_values = np.asarray(parameter_results, dtype=np.float64)
+    edges = np.asarray(intervals, dtype=np.float64)
+    bin_index = np.searchsorted(edges, parameter_values, side="right")
+    bin_index[parameter_values == edges[-1]] = len(edges) - 1
+    bin_names = ["< {0:1.{j}f}".format(intervals[0],
+                                       j=legend_decimal_places)]
+    for i in range(len(intervals) - 1):
+        bin_names.append("{0:1.{j}f} - {1:1.{j}f}".format(
+            intervals[i], intervals[i + 1],
+            j=legend_decimal_places))
+    bin_names.append("> {0:1.{j}f}".format(intervals[-1],
+                                           j=legend_decimal_places))
+    # The open-ended bins are only listed when some value falls into them
+    interval_names = bin_names[1:-1]
+    if np.any(bin_index == 0):
+        interval_names.insert(0, bin_names[0])
+    if np.any(bin_index == len(edges)):
+        interval_names.append(bin_names[-1])
+    interval_results = {}
     for bin_name in interval_names:
         interval_results[bin_name] = {}
-    for i in range(len(intervals)):
-        if i == 0:
-            for j, parameter in enumerate(parameter_results):
-                if parameter >= intervals[i] and parameter < intervals[i + 1]:
-
-                    interval_results["{0:1.{j}f} - {1:1.{j}f}".format(
-                        intervals[i],
-                        intervals[i + 1],
-                        j=legend_decimal_places)][elements_with_parameter[j]] \
-                        = element_list.index(elements_with_parameter[j])
-                if parameter < intervals[i]:
-                    interval_results["< {0:1.{j}f}".format(
-                        intervals[i],
-                        j=legend_decimal_places)][elements_with_parameter[j]] \
-                        = element_list.index(elements_with_parameter[j])
-        elif i == len(intervals) - 2:
-            for j, parameter in enumerate(parameter_results):
-                if parameter >= intervals[i] and parameter <= intervals[i + 1]:
-                    interval_results["{0:1.{j}f} - {1:1.{j}f}".format(
-                        intervals[i],
-                        intervals[i + 1],
-                        j=legend_decimal_places)][elements_with_parameter[j]] \
-                        = element_list.index(elements_with_parameter[j])
-        elif i < len(intervals) - 2:
-            for j, parameter in enumerate(parameter_results):
-                if parameter >= intervals[i] and parameter < intervals[i + 1]:
-                    interval_results["{0:1.{j}f} - {1:1.{j}f}".format(
-                        intervals[i],
-                        intervals[i + 1],
-                        j=legend_decimal_places)][elements_with_parameter[j]] \
-                        = element_list.index(elements_with_parameter[j])
-        elif i == len(intervals) - 1:
-            for j, parameter in enumerate(parameter_results):
-                if parameter > intervals[i]:
-                    interval_results["> {0:1.{j}f}".format(
-                        intervals[i],
-                        j=legend_decimal_places)][elements_with_parameter[j]] \
-                        = element_list.index(elements_with_parameter[j])
+    # Group element positions by bin in one shot: a stable sort keeps the
+    # original element order within each bin, and the bin counts give the
+    # split points
+    bin_groups = np.split(
+        np.argsort(bin_index, kind="stable"),
+        np.cumsum(np.bincount(bin_index, minlength=len(bin_names)))[:-1])
+    for bin_name, bin_group in zip(bin_names, bin_groups):
+        if len(bin_group) == 0:
+            continue
+        interval_results[bin_name].update(
+            (elements_with_parameter[j],
+             element_index[elements_with_parameter[j]])
+            for j in bin_group)
     if disable_interval_deleting is True:
         pass
     else:
-        for bin_name in interval_names:
-            if not interval_results[bin_name]:
-                del interval_names[interval_names.index(bin_name)]
-                del interval_results[bin_name]
+        interval_names = [bin_name for bin_name in interval_names
+                          if interval_results[bin_name]]
+        interval_results = {bin_name: interval_results[bin_name]
+                            for bin_name in interval_names}
     return interval_results, interval_names
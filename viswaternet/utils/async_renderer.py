@@ -0,0 +1,28 @@
+"""
+The viswaternet.utils.async_renderer module runs drawing calls on a single
+background thread. This lets data processing continue while legends and
+color bars are laid out on a long-lived figure. Matplotlib artists are not
+thread safe, so the figure must not be touched from other threads until
+wait() has returned.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+_executor = None
+
+
+def submit(func, *args, **kwargs):
+    """Queues func(*args, **kwargs) on the render thread and returns a
+    concurrent.futures.Future for its result. Calls run one at a time, in the
+    order they were submitted."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1,
+                                       thread_name_prefix="viswaternet")
+    return _executor.submit(func, *args, **kwargs)
+
+
+def wait():
+    """Blocks until every drawing call queued so far has finished. Errors
+    raised by a call are kept on its Future."""
+    if _executor is not None:
+        _executor.submit(lambda: None).result()
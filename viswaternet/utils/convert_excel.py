@@ -27,15 +27,14 @@ def convert_excel(self,
                 ), df.iloc[:, value_index].dropna()
             ):
 
-                interval_results[data][element] = model["node_names"].index(
-                    element)
+                interval_results[data][element] = model["node_index"][element]
 
         if parameter_type == 'link':
             for element, data in zip(
                     df.iloc[:, element_index].dropna(),
                     df.iloc[:, value_index].dropna()):
                 interval_results[data][element] = \
-                    model["G_pipe_name_list"].index(element)
+                    model["link_index"][element]
 
         return interval_results, interval_names
     if data_type == "continuous" or "discrete":